@@ -0,0 +1,58 @@
+# Benchmark: Pass -> Ball Receipt join over a whole season, following
+# related_events through the event_relations edge table versus parsing the
+# related_events JSON text on every row.
+#
+# Run from the repository root:  python benchmarks/event_links_benchmark.py
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'json_loader'))
+from db import connect
+from event_links import PASS_RECEIPT_QUERY, PASS_RECEIPT_JSON_QUERY, backfill_event_relations
+from json_loader_source import db_parameters
+
+# La Liga 2020/2021
+competition_id = 11
+season_id = 90
+repeats = 5
+
+def time_query(cursor, query, params):
+    timings = []
+    row_count = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        row_count = len(cursor.fetchall())
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), min(timings), row_count
+
+def run_benchmark(db_params):
+    conn = connect(db_params)
+    cursor = conn.cursor()
+
+    # Make sure the edge table is populated for databases loaded before it existed
+    cursor.execute("SELECT to_regclass('event_relations') IS NOT NULL AND EXISTS (SELECT 1 FROM event_relations);")
+    if not cursor.fetchone()[0]:
+        print(f"Backfilled {backfill_event_relations(cursor)} event links")
+        conn.commit()
+    cursor.execute("ANALYZE event_relations;")
+
+    params = (competition_id, season_id)
+    json_median, json_best, json_rows = time_query(cursor, PASS_RECEIPT_JSON_QUERY, params)
+    edge_median, edge_best, edge_rows = time_query(cursor, PASS_RECEIPT_QUERY, params)
+
+    print(f"{'variant':<20}{'rows':>10}{'median ms':>12}{'best ms':>12}")
+    print(f"{'json text':<20}{json_rows:>10}{json_median:>12.1f}{json_best:>12.1f}")
+    print(f"{'edge table':<20}{edge_rows:>10}{edge_median:>12.1f}{edge_best:>12.1f}")
+    if json_rows != edge_rows:
+        print(f"[WARNING] Row counts differ: json text {json_rows}, edge table {edge_rows}")
+    print(f"Speedup: {json_median / edge_median:.2f}x")
+
+    cursor.close()
+    conn.close()
+
+if __name__ == "__main__":
+    run_benchmark(db_parameters)
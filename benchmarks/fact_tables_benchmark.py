@@ -0,0 +1,68 @@
+# Benchmark: Q_1 to Q_10 as written in queries.py (JSON casts on
+# events.event_details) against the same queries rewritten on the shots,
+# passes, dribbles and dribbled_past fact tables. Fact tables are backfilled
+# from events first if they are empty, and both versions must return the
+# same rows.
+#
+# Run from the repository root:  python benchmarks/fact_tables_benchmark.py
+
+import ast
+import os
+import statistics
+import sys
+import time
+
+benchmark_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(benchmark_dir, '..', 'json_loader'))
+from db import connect
+from fact_tables import FACT_QUERIES, backfill_fact_tables
+from json_loader_source import db_parameters
+
+repeats = 5
+
+# The SQL assigned to `query` in each Q_n of queries.py
+def queries_py_sql():
+    with open(os.path.join(benchmark_dir, '..', 'queries.py'), 'r', encoding='utf-8') as file:
+        tree = ast.parse(file.read())
+    sql = {}
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name.startswith('Q_'):
+            for statement in node.body:
+                if (isinstance(statement, ast.Assign) and isinstance(statement.targets[0], ast.Name)
+                        and statement.targets[0].id == 'query'):
+                    sql[int(node.name[2:])] = statement.value.value
+    return sql
+
+def time_query(cursor, query):
+    timings = []
+    rows = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), sorted(rows, key=repr)
+
+def run_benchmark(db_params):
+    conn = connect(db_params)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT to_regclass('shots') IS NOT NULL AND EXISTS (SELECT 1 FROM shots);")
+    if not cursor.fetchone()[0]:
+        backfill_fact_tables(cursor)
+        conn.commit()
+        print("Backfilled fact tables from events")
+
+    events_sql = queries_py_sql()
+    print(f"{'query':<7}{'events ms':>11}{'facts ms':>10}{'speedup':>9}{'rows':>7}  same result")
+    for n in sorted(FACT_QUERIES):
+        events_ms, events_rows = time_query(cursor, events_sql[n])
+        facts_ms, facts_rows = time_query(cursor, FACT_QUERIES[n])
+        print(f"Q_{n:<5}{events_ms:>11.1f}{facts_ms:>10.1f}{events_ms / facts_ms:>8.1f}x{len(facts_rows):>7}  "
+              f"{'yes' if events_rows == facts_rows else 'NO'}")
+
+    cursor.close()
+    conn.close()
+
+if __name__ == "__main__":
+    run_benchmark(db_parameters)
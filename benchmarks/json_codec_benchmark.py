@@ -0,0 +1,70 @@
+# Benchmark: decoding the whole json_loader/data tree with the standard
+# library versus the json_codec backend (orjson when installed). Only decode
+# time is measured, not file reads. Encoding is not timed: json_codec.dumps is
+# json.dumps on purpose (see json_codec.py). Instead, the decoded objects and
+# the JSON the loader would store from them (location, related_events and
+# event_details) are checked to be identical for both backends.
+#
+# Run from the repository root:  python benchmarks/json_codec_benchmark.py
+
+import glob
+import json
+import os
+import sys
+import time
+
+benchmark_dir = os.path.dirname(os.path.realpath(__file__))
+data_dir = os.path.join(benchmark_dir, '..', 'json_loader', 'data')
+sys.path.insert(0, os.path.join(benchmark_dir, '..', 'json_loader'))
+import json_codec
+
+# The three columns load_events_data encodes for every event
+def stored_json(events_data, dumps):
+    stored = []
+    for event in events_data:
+        event_details = event.get(event['type']['name'].lower().replace(" ", "_"))
+        stored.append((dumps(event.get('location')), dumps(event.get('related_events')),
+                       dumps(event_details) if event_details else None))
+    return stored
+
+# Decode one file at a time, as the loader does, so timings are
+# not skewed by garbage collection over every decoded file at once
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+def run_benchmark():
+    paths = sorted(glob.glob(os.path.join(data_dir, '**', '*.json'), recursive=True))
+    print(f"{len(paths)} files, json_codec backend: {json_codec.backend}")
+
+    total_mb = 0.0
+    timings = {'json': 0.0, 'codec': 0.0}
+    same_objects = True
+    same_stored = True
+    for path in paths:
+        with open(path, 'rb') as file:
+            raw = file.read()
+        total_mb += len(raw) / 1e6
+
+        seconds, stdlib_object = timed(json.loads, raw)
+        timings['json'] += seconds
+        seconds, codec_object = timed(json_codec.loads, raw)
+        timings['codec'] += seconds
+        same_objects = same_objects and stdlib_object == codec_object
+
+        if os.sep + 'events' + os.sep in path:
+            same_stored = same_stored and (stored_json(stdlib_object, json.dumps)
+                                           == stored_json(codec_object, json_codec.dumps))
+
+    print(f"{'step':<8}{'json s':>9}{'codec s':>9}{'speedup':>9}{'MB/s':>8}")
+    print(f"{'decode':<8}{timings['json']:>9.2f}{timings['codec']:>9.2f}"
+          f"{timings['json'] / timings['codec']:>8.2f}x{total_mb / timings['codec']:>8.0f}")
+    print(f"{total_mb:.0f} MB decoded; encoding stays on the standard library json.dumps and is not timed")
+    print(f"Decoded objects identical: {'yes' if same_objects else 'NO'}")
+    print(f"Stored JSON byte-identical: {'yes' if same_stored else 'NO'}")
+    return same_objects and same_stored
+
+if __name__ == "__main__":
+    if not run_benchmark():
+        sys.exit(1)
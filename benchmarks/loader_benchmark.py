@@ -0,0 +1,224 @@
+# Loader micro-benchmarks: rows per second and statements issued for each
+# loader function over small, medium and large fixtures taken from the
+# La Liga 2020/2021 files in json_loader/data. Runs against a local Postgres
+# that already holds a full load (the fixtures reuse its teams, players, ...).
+#
+# Every function is measured in two modes:
+#   write    - content hashes of the fixture rows are cleared first, so every row is rewritten
+#   reingest - the fixture is loaded over identical rows, so change detection skips them
+# Loads run inside a transaction that is rolled back, so the database is left as it was.
+#
+# Results are saved to benchmarks/results/ and compared with a baseline: the
+# stored baseline-loader.json if there is one (--save-baseline writes the
+# current run there), otherwise the median of the last baseline_runs runs.
+# The script exits with status 1 if a function got slower than the threshold.
+#
+# Run from the repository root:  python benchmarks/loader_benchmark.py [threshold] [--save-baseline]
+
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+import psycopg
+
+benchmark_dir = os.path.dirname(os.path.realpath(__file__))
+loader_dir = os.path.join(benchmark_dir, '..', 'json_loader')
+results_dir = os.path.join(benchmark_dir, 'results')
+sys.path.insert(0, loader_dir)
+from db import connect, pipelined
+from json_loader_source import (filter_competitions, load_competitions_data, load_matches_data, load_events_data,
+                                load_lineups_data, db_parameters)
+
+# Number of matches in each fixture
+fixture_sizes = {'small': 1, 'medium': 5, 'large': 20}
+fixture_competition_id = 11
+fixture_season_id = 90
+repeats = 3
+
+# A run is flagged if rows per second drops by more than this fraction
+default_threshold = 0.2
+# Without a stored baseline, compare with the median of this many previous runs
+baseline_runs = 5
+baseline_file = os.path.join(results_dir, 'baseline-loader.json')
+
+# Cursor that counts statements sent to the server
+class CountingCursor(psycopg.Cursor):
+    statements = 0
+
+    def execute(self, query, params=None, **kwargs):
+        CountingCursor.statements += 1
+        return super().execute(query, params, **kwargs)
+
+    def executemany(self, query, params_seq, **kwargs):
+        params_seq = list(params_seq)
+        CountingCursor.statements += len(params_seq)
+        return super().executemany(query, params_seq, **kwargs)
+
+def read_json(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def load_fixtures():
+    data_dir = os.path.join(loader_dir, 'data')
+    season_matches = read_json(f'{data_dir}/matches/{fixture_competition_id}/{fixture_season_id}.json')
+    season_matches.sort(key=lambda match: match['match_id'])
+
+    fixtures = {}
+    for size, match_count in fixture_sizes.items():
+        matches = season_matches[:match_count]
+        fixtures[size] = {
+            'matches': matches,
+            'events': [(m['match_id'], read_json(f"{data_dir}/events/{m['match_id']}.json")) for m in matches],
+            'lineups': [(m['match_id'], read_json(f"{data_dir}/lineups/{m['match_id']}.json")) for m in matches],
+        }
+    return fixtures
+
+def clear_hashes(cursor, table, match_ids):
+    cursor.execute(f"UPDATE {table} SET content_hash = NULL WHERE match_id = ANY(%s);", (match_ids,))
+
+# Time one loader call inside a rolled back transaction, in pipeline mode like
+# the load_all_* functions
+def measure(conn, prepare, load, use_pipeline=True):
+    timings = []
+    statements = 0
+    for _ in range(repeats):
+        cursor = conn.cursor()
+        prepare(cursor)
+        CountingCursor.statements = 0
+        start = time.perf_counter()
+        with pipelined(cursor, use_pipeline):
+            load(cursor)
+        timings.append(time.perf_counter() - start)
+        statements = CountingCursor.statements
+        cursor.close()
+        conn.rollback()
+    return statistics.median(timings), statements
+
+def bench_loader(conn, fixture, function, mode, use_pipeline=True):
+    match_ids = [match['match_id'] for match in fixture['matches']]
+
+    if function == 'load_matches_data':
+        table = 'matches'
+        rows = len(fixture['matches'])
+        load = lambda cursor: load_matches_data(fixture['matches'], cursor)
+    elif function == 'load_events_data':
+        table = 'events'
+        rows = sum(len(events) for _, events in fixture['events'])
+        load = lambda cursor: [load_events_data(match_id, events, cursor) for match_id, events in fixture['events']]
+    else:
+        table = 'lineups'
+        rows = sum(len(team['lineup']) for _, lineup in fixture['lineups'] for team in lineup)
+        load = lambda cursor: [load_lineups_data(match_id, lineup, cursor) for match_id, lineup in fixture['lineups']]
+
+    prepare = (lambda cursor: clear_hashes(cursor, table, match_ids)) if mode == 'write' else (lambda cursor: None)
+    seconds, statements = measure(conn, prepare, load, use_pipeline)
+    return rows, seconds, statements
+
+def bench_competitions(conn, mode):
+    competitions = read_json(os.path.join(loader_dir, 'data', 'competitions.json'))
+    rows = len(filter_competitions(competitions))
+    clear = lambda cursor: cursor.execute("UPDATE competitions SET content_hash = NULL;")
+    seconds, statements = measure(conn, clear if mode == 'write' else (lambda cursor: None),
+                                  lambda cursor: load_competitions_data(competitions, cursor), False)
+    return rows, seconds, statements
+
+def run_benchmarks(db_params):
+    db_params = dict(db_params, cursor_factory=CountingCursor)
+    fixtures = load_fixtures()
+    conn = connect(db_params)
+
+    results = []
+    for function in ('load_matches_data', 'load_events_data', 'load_lineups_data'):
+        for mode in ('write', 'reingest'):
+            for size, fixture in fixtures.items():
+                rows, seconds, statements = bench_loader(conn, fixture, function, mode)
+                results.append({'function': function, 'mode': mode, 'fixture': size, 'rows': rows,
+                                 'seconds': seconds, 'statements': statements,
+                                 'rows_per_second': rows / seconds if seconds else 0.0})
+
+    for mode in ('write', 'reingest'):
+        rows, seconds, statements = bench_competitions(conn, mode)
+        results.append({'function': 'load_competitions_data', 'mode': mode, 'fixture': 'competitions.json',
+                        'rows': rows, 'seconds': seconds, 'statements': statements,
+                        'rows_per_second': rows / seconds if seconds else 0.0})
+    conn.close()
+    return results
+
+def print_results(results):
+    print(f"{'function':<26}{'mode':<10}{'fixture':<19}{'rows':>8}{'ms':>10}{'rows/s':>11}{'stmts':>8}")
+    for r in results:
+        print(f"{r['function']:<26}{r['mode']:<10}{r['fixture']:<19}{r['rows']:>8}{r['seconds'] * 1000:>10.1f}"
+              f"{r['rows_per_second']:>11.0f}{r['statements']:>8}")
+
+def save_results(results):
+    os.makedirs(results_dir, exist_ok=True)
+    file_path = os.path.join(results_dir, f"loader-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    return file_path
+
+def result_key(r):
+    return (r['function'], r['mode'], r['fixture'])
+
+# The stored baseline, or per function the median rows per second and
+# statements of the last baseline_runs runs
+def baseline_results(exclude):
+    if os.path.exists(baseline_file):
+        return read_json(baseline_file), 'stored baseline'
+    if not os.path.isdir(results_dir):
+        return None, None
+    runs = sorted(f for f in os.listdir(results_dir) if f.startswith('loader-') and f != os.path.basename(exclude))
+    runs = runs[-baseline_runs:]
+    if not runs:
+        return None, None
+    samples = {}
+    for run in runs:
+        for r in read_json(os.path.join(results_dir, run)):
+            samples.setdefault(result_key(r), []).append(r)
+    baseline = [dict(zip(('function', 'mode', 'fixture'), key),
+                     rows_per_second=statistics.median(r['rows_per_second'] for r in rs),
+                     statements=statistics.median(r['statements'] for r in rs))
+                for key, rs in samples.items()]
+    return baseline, f"median of the last {len(runs)} runs"
+
+def save_baseline(results):
+    os.makedirs(results_dir, exist_ok=True)
+    with open(baseline_file, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+
+# Compare against the baseline; returns the number of regressions
+def compare_results(baseline, results, threshold):
+    baseline = {result_key(r): r for r in baseline}
+    regressions = 0
+    for r in results:
+        before = baseline.get(result_key(r))
+        if before is None or not before['rows_per_second']:
+            continue
+        change = r['rows_per_second'] / before['rows_per_second'] - 1
+        if change < -threshold or r['statements'] > before['statements']:
+            print(f"[REGRESSION] {r['function']} {r['mode']} {r['fixture']}: "
+                  f"{before['rows_per_second']:.0f} -> {r['rows_per_second']:.0f} rows/s ({change:+.0%}), "
+                  f"{before['statements']:g} -> {r['statements']} statements")
+            regressions += 1
+    return regressions
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != '--save-baseline']
+    threshold = float(args[0]) if args else default_threshold
+    results = run_benchmarks(db_parameters)
+    print_results(results)
+    file_path = save_results(results)
+    print(f"Results saved to {file_path}")
+
+    baseline, source = baseline_results(file_path)
+    regressions = 0
+    if baseline is not None:
+        print(f"Comparing with the {source}")
+        regressions = compare_results(baseline, results, threshold)
+    if '--save-baseline' in sys.argv[1:]:
+        save_baseline(results)
+        print(f"Baseline saved to {baseline_file}")
+    if regressions:
+        sys.exit(1)
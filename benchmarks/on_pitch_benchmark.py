@@ -0,0 +1,113 @@
+# Benchmark: season-wide join of shots to the players on the pitch when they
+# were taken (json_loader/on_pitch.py), with the GiST index on
+# lineup_spells (match_id, on_pitch) and with index scans disabled, plus a
+# single "who was playing at minute X" lookup. Also checks the intervals:
+# at every shot, each team must have 11 players on the pitch, less those who
+# went off without being replaced (a temporary 'Player Off', a sending off)
+# and had not come back yet. The script exits with status 1 if any does not.
+#
+# Run from the repository root after a load:  python benchmarks/on_pitch_benchmark.py
+
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+benchmark_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(benchmark_dir, '..'))
+sys.path.insert(0, os.path.join(benchmark_dir, '..', 'json_loader'))
+from db import connect
+from on_pitch import ON_PITCH_XG_QUERY, EVENT_TIME_SQL, players_on_pitch
+from json_loader_source import db_parameters
+from query_catalog import event_type_id, load_event_type_ids
+
+# La Liga 2020/2021
+competition_id = 11
+season_id = 90
+repeats = 5
+
+# For each shot of the season and each team of its match: the players on the
+# pitch, and the players who went off unreplaced (not substituted, no tactical
+# shift, not the final whistle) before the shot without coming back by then
+PLAYERS_PER_SHOT_QUERY = f"""
+    WITH shots AS (
+        SELECT e.event_id, e.match_id, {EVENT_TIME_SQL} AS event_time
+        FROM events e
+        JOIN matches m ON e.match_id = m.match_id
+        WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+          AND e.type_id = %(type_id)s
+    ), match_teams AS (
+        SELECT DISTINCT match_id, team_id FROM lineup_spells
+    )
+    SELECT s.event_id, t.team_id,
+           (SELECT COUNT(*) FROM lineup_spells ls
+            WHERE ls.match_id = s.match_id AND ls.team_id = t.team_id AND ls.on_pitch @> s.event_time) AS players,
+           (SELECT COUNT(DISTINCT ls.player_id) FROM lineup_spells ls
+            WHERE ls.match_id = s.match_id AND ls.team_id = t.team_id AND upper(ls.on_pitch) <= s.event_time
+              AND ls.end_reason NOT LIKE 'Substitution%%' AND ls.end_reason NOT IN ('Tactical Shift', 'Final Whistle')
+              AND NOT EXISTS (SELECT 1 FROM lineup_spells back
+                              WHERE back.match_id = ls.match_id AND back.player_id = ls.player_id
+                                AND lower(back.on_pitch) >= upper(ls.on_pitch)
+                                AND lower(back.on_pitch) <= s.event_time)) AS off_unreplaced
+    FROM shots s
+    JOIN match_teams t ON t.match_id = s.match_id;
+"""
+
+def time_query(cursor, query, params, settings=()):
+    timings = []
+    row_count = 0
+    for _ in range(repeats):
+        cursor.connection.rollback()
+        for setting in settings:
+            cursor.execute(f"SET LOCAL {setting};")
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        row_count = len(cursor.fetchall())
+        timings.append((time.perf_counter() - start) * 1000)
+    cursor.connection.rollback()
+    return statistics.median(timings), row_count
+
+def run_benchmark(db_params):
+    conn = connect(db_params)
+    cursor = conn.cursor()
+    cursor.execute("ANALYZE lineup_spells;")
+    conn.commit()
+    load_event_type_ids(cursor)
+
+    params = {'competition_id': competition_id, 'season_id': season_id, 'type_id': event_type_id('Shot')}
+    indexed_ms, indexed_rows = time_query(cursor, ON_PITCH_XG_QUERY, params)
+    no_index_ms, no_index_rows = time_query(cursor, ON_PITCH_XG_QUERY, params,
+                                            ('enable_indexscan = off', 'enable_bitmapscan = off'))
+    print(f"{'variant':<24}{'rows':>8}{'median ms':>12}")
+    print(f"{'GiST index':<24}{indexed_rows:>8}{indexed_ms:>12.1f}")
+    print(f"{'index scans disabled':<24}{no_index_rows:>8}{no_index_ms:>12.1f}")
+    print(f"Speedup: {no_index_ms / indexed_ms:.2f}x")
+
+    cursor.execute("""
+        SELECT match_id FROM matches WHERE competition_id = %(competition_id)s AND season_id = %(season_id)s
+        ORDER BY match_id LIMIT 1;
+    """, params)
+    match_id = cursor.fetchone()[0]
+    start = time.perf_counter()
+    on_pitch = players_on_pitch(cursor, match_id, 2, 60)
+    print(f"Players on the pitch in match {match_id} at 60:00: {len(on_pitch)} "
+          f"({(time.perf_counter() - start) * 1000:.2f} ms)")
+
+    cursor.execute(PLAYERS_PER_SHOT_QUERY, params)
+    counts = cursor.fetchall()
+    distribution = Counter(players for _, _, players, _ in counts)
+    print("Players per team at each shot: " + ", ".join(f"{players}: {count}" for players, count in sorted(distribution.items())))
+    wrong = [(event_id, team_id, players, 11 - off) for event_id, team_id, players, off in counts if players != 11 - off]
+    for event_id, team_id, players, expected in wrong[:10]:
+        print(f"[ERROR] shot {event_id}: team {team_id} has {players} players on the pitch, expected {expected}")
+    if wrong:
+        print(f"[ERROR] {len(wrong)} of {len(counts)} team counts at shots are wrong")
+
+    cursor.close()
+    conn.close()
+    return len(wrong)
+
+if __name__ == "__main__":
+    if run_benchmark(db_parameters):
+        sys.exit(1)
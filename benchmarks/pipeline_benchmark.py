@@ -0,0 +1,88 @@
+# Benchmark: the loader's database layer with and without psycopg 3 pipeline
+# mode and prepared statements, on loopback and with added network latency.
+#
+# Latency is added by a local TCP proxy that delays every chunk by half the
+# round trip time in each direction, so no root access (tc netem) is needed.
+# Loads use the medium loader fixture in write mode and are rolled back.
+#
+# Run from the repository root:  python benchmarks/pipeline_benchmark.py [rtt_ms ...]
+# (default round trips: 0 (loopback, no proxy), 1 and 5 ms)
+
+import socket
+import sys
+import threading
+import time
+from loader_benchmark import CountingCursor, load_fixtures, bench_loader, db_parameters
+from db import connect
+
+# (label, prepare_threshold, use_pipeline)
+variants = [
+    ('execute', None, False),
+    ('prepared', 1, False),
+    ('pipeline+prepared', 1, True),
+]
+fixture_size = 'medium'
+default_round_trips_ms = [0, 1, 5]
+
+def _pump(source, target, delay):
+    try:
+        while True:
+            data = source.recv(65536)
+            if not data:
+                break
+            if delay:
+                time.sleep(delay)
+            target.sendall(data)
+    except OSError:
+        pass
+    finally:
+        for sock in (source, target):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+# Forward connections on a free local port to the database, delaying each
+# direction by rtt/2. Returns the port to connect to.
+def start_latency_proxy(target_host, target_port, rtt_ms):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    delay = rtt_ms / 2000
+
+    def serve():
+        while True:
+            client, _ = listener.accept()
+            upstream = socket.create_connection((target_host, target_port))
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=_pump, args=(client, upstream, delay), daemon=True).start()
+            threading.Thread(target=_pump, args=(upstream, client, delay), daemon=True).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return listener.getsockname()[1]
+
+def run_benchmark(db_params, round_trips_ms):
+    fixture = load_fixtures()[fixture_size]
+
+    print(f"{'rtt ms':>7}  {'variant':<20}{'function':<20}{'rows':>7}{'ms':>10}{'rows/s':>10}{'stmts':>7}")
+    for rtt_ms in round_trips_ms:
+        params = dict(db_params, cursor_factory=CountingCursor)
+        if rtt_ms:
+            params['port'] = start_latency_proxy(db_params.get('host', 'localhost'), int(db_params.get('port', 5432)), rtt_ms)
+            params['host'] = '127.0.0.1'
+
+        baseline = {}
+        for label, prepare_threshold, use_pipeline in variants:
+            conn = connect(params, prepare_threshold=prepare_threshold)
+            for function in ('load_events_data', 'load_lineups_data'):
+                rows, seconds, statements = bench_loader(conn, fixture, function, 'write', use_pipeline)
+                baseline.setdefault(function, seconds)
+                print(f"{rtt_ms:>7}  {label:<20}{function:<20}{rows:>7}{seconds * 1000:>10.1f}"
+                      f"{rows / seconds:>10.0f}{statements:>7}  ({baseline[function] / seconds:.1f}x)")
+            conn.close()
+
+if __name__ == "__main__":
+    round_trips = [float(arg) for arg in sys.argv[1:]] or default_round_trips_ms
+    run_benchmark(db_parameters, round_trips)
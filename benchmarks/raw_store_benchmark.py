@@ -0,0 +1,97 @@
+# Benchmark: the json_loader/data tree stored plain, gzip-compressed and
+# (when the zstandard package is installed) zstd-compressed. For each layout
+# it reports the on-disk size and the time to read, decompress and decode
+# every file the way the loader does (json_codec.load_path), with a cold and
+# a warm page cache. Wall time shows I/O plus CPU; CPU time shows what the
+# decompression costs on top of decoding.
+#
+# Cold cache: each file is dropped from the page cache with
+# posix_fadvise(DONTNEED) before it is read (after a sync), which needs no
+# privileges. Compressed copies are written to benchmarks/results/raw_store/
+# on the same disk as the data, so they are read from the same device.
+#
+# Run from the repository root:  python benchmarks/raw_store_benchmark.py [--rebuild]
+
+import glob
+import os
+import shutil
+import sys
+import time
+
+benchmark_dir = os.path.dirname(os.path.realpath(__file__))
+data_dir = os.path.join(benchmark_dir, '..', 'json_loader', 'data')
+store_dir = os.path.join(benchmark_dir, 'results', 'raw_store')
+sys.path.insert(0, os.path.join(benchmark_dir, '..', 'json_loader'))
+import json_codec
+import raw_store
+
+def layout_files(root):
+    return sorted(path for path in glob.glob(os.path.join(root, '**', '*'), recursive=True)
+                  if os.path.isfile(path) and '.json' in os.path.basename(path))
+
+# Bytes actually allocated on disk, not just the file lengths
+def disk_usage(paths):
+    return sum(os.stat(path).st_blocks * 512 for path in paths)
+
+def drop_from_page_cache(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+def load_all(paths, cold):
+    if cold:
+        os.sync()
+        for path in paths:
+            drop_from_page_cache(path)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    objects = 0
+    for path in paths:
+        data = json_codec.load_path(path)
+        objects += len(data)
+    return time.perf_counter() - wall_start, time.process_time() - cpu_start, objects
+
+def build_layouts(rebuild):
+    layouts = {'plain': data_dir}
+    compressions = ['gzip'] + (['zstd'] if raw_store.zstandard is not None else [])
+    for compression in compressions:
+        target_dir = os.path.join(store_dir, compression)
+        if rebuild and os.path.isdir(target_dir):
+            shutil.rmtree(target_dir)
+        if not os.path.isdir(target_dir):
+            start = time.perf_counter()
+            raw_store.compress_tree(data_dir, target_dir, compression)
+            print(f"Compressed data to {compression} in {time.perf_counter() - start:.1f} s")
+        layouts[compression] = target_dir
+    if raw_store.zstandard is None:
+        print("zstandard not installed, skipping zstd")
+    return layouts
+
+def run_benchmark(rebuild=False):
+    layouts = build_layouts(rebuild)
+    print(f"json_codec backend: {json_codec.backend}")
+
+    results = {}
+    for name, root in layouts.items():
+        paths = layout_files(root)
+        cold_wall, cold_cpu, objects = load_all(paths, cold=True)
+        warm_wall, warm_cpu, _ = load_all(paths, cold=False)
+        results[name] = (len(paths), disk_usage(paths), cold_wall, cold_cpu, warm_wall, warm_cpu, objects)
+
+    plain = results['plain']
+    print(f"{'layout':<7}{'files':>7}{'disk MB':>9}{'ratio':>7}{'cold s':>8}{'cold cpu':>10}"
+          f"{'warm s':>8}{'warm cpu':>10}{'vs plain':>10}")
+    for name, (files, size, cold_wall, cold_cpu, warm_wall, warm_cpu, _) in results.items():
+        print(f"{name:<7}{files:>7}{size / 1e6:>9.1f}{plain[1] / size:>6.1f}x{cold_wall:>8.2f}{cold_cpu:>10.2f}"
+              f"{warm_wall:>8.2f}{warm_cpu:>10.2f}{cold_wall / plain[2]:>9.2f}x")
+
+    # Every layout must decode to the same data
+    same = all(result[0] == plain[0] and result[6] == plain[6] for result in results.values())
+    print(f"Same files and top-level objects in every layout: {'yes' if same else 'NO'}")
+    return same
+
+if __name__ == "__main__":
+    if not run_benchmark('--rebuild' in sys.argv[1:]):
+        sys.exit(1)
@@ -0,0 +1,131 @@
+# Benchmark: reading a match timeline page by page. For the match with the
+# most events in La Liga 2020/2021 it compares the first, middle and last page
+# read with keyset pagination (json_loader/timeline.py) and with
+# ORDER BY ... OFFSET, reporting time and shared buffers touched per page.
+# It also times streaming the whole match, with and without a minute range,
+# against the current client-side approach of fetching everything and sorting.
+#
+# Run from the repository root:  python benchmarks/timeline_benchmark.py
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'json_loader'))
+from db import connect
+from timeline import (create_timeline_index, read_timeline_page, stream_timeline, timeline_query,
+                      TIMELINE_ORDER, min_minute, max_minute)
+from json_loader_source import db_parameters
+
+# La Liga 2020/2021
+competition_id = 11
+season_id = 90
+page_size = 200
+repeats = 5
+
+OFFSET_PAGE_QUERY = f"""
+    SELECT e.event_id, e.period, e.timestamp, e.minute, e.second, e.possession, et.name AS type_name,
+           e.player_id, e.team_id, e.location, e.related_events, e.event_details
+    FROM events e
+    JOIN event_types et ON e.type_id = et.type_id
+    WHERE e.match_id = %(match_id)s
+    ORDER BY {TIMELINE_ORDER}
+    OFFSET %(offset)s LIMIT %(page_size)s;
+"""
+
+# What consumers do today: fetch the whole match and sort it themselves
+FETCH_ALL_QUERY = """
+    SELECT e.event_id, e.period, e.timestamp, e.minute, e.second, e.possession, et.name AS type_name,
+           e.player_id, e.team_id, e.location, e.related_events, e.event_details
+    FROM events e
+    JOIN event_types et ON e.type_id = et.type_id
+    WHERE e.match_id = %(match_id)s;
+"""
+
+def timed(function, *args):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+def shared_buffers(cursor, query, params):
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+    plan = cursor.fetchone()[0][0]['Plan']
+    return plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+
+def longest_match(cursor):
+    cursor.execute("""
+        SELECT e.match_id, COUNT(*) AS events
+        FROM events e
+        JOIN matches m ON e.match_id = m.match_id
+        WHERE m.competition_id = %s AND m.season_id = %s
+        GROUP BY e.match_id
+        ORDER BY events DESC
+        LIMIT 1;
+    """, (competition_id, season_id))
+    return cursor.fetchone()
+
+# Keyset of the last row before each page start, found by walking the timeline
+def page_keys(cursor, match_id, page_numbers):
+    keys = {0: None}
+    key = None
+    for page in range(1, max(page_numbers) + 1):
+        _, key = read_timeline_page(cursor, match_id, key, page_size=page_size)
+        keys[page] = key
+    return {page: keys[page] for page in page_numbers}
+
+def read_offset_page(cursor, params):
+    cursor.execute(OFFSET_PAGE_QUERY, params)
+    return cursor.fetchall()
+
+def fetch_all_and_sort(cursor, match_id):
+    cursor.execute(FETCH_ALL_QUERY, {'match_id': match_id})
+    return sorted(cursor.fetchall(), key=lambda row: (row[1], row[2], str(row[0])))
+
+def run_benchmark(db_params):
+    conn = connect(db_params)
+    cursor = conn.cursor()
+    create_timeline_index(cursor)
+    conn.commit()
+    cursor.execute("ANALYZE events;")
+
+    match_id, event_count = longest_match(cursor)
+    last_page = (event_count - 1) // page_size
+    pages = {'first': 0, 'middle': last_page // 2, 'last': last_page}
+    keys = page_keys(cursor, match_id, pages.values())
+    print(f"Match {match_id}: {event_count} events, {last_page + 1} pages of {page_size}")
+
+    print(f"{'page':<8}{'keyset ms':>11}{'buffers':>9}{'offset ms':>11}{'buffers':>9}")
+    for name, page in pages.items():
+        key = keys[page]
+        keyset_params = {'match_id': match_id, 'minute_from': min_minute, 'minute_to': max_minute,
+                         'page_size': page_size}
+        if key:
+            keyset_params.update(zip(('period', 'minute', 'timestamp', 'event_id'), key))
+        offset_params = {'match_id': match_id, 'offset': page * page_size, 'page_size': page_size}
+
+        keyset_ms, _ = timed(read_timeline_page, cursor, match_id, key, None, None, page_size)
+        keyset_buffers = shared_buffers(cursor, timeline_query(key), keyset_params)
+        offset_ms, _ = timed(read_offset_page, cursor, offset_params)
+        offset_buffers = shared_buffers(cursor, OFFSET_PAGE_QUERY, offset_params)
+        print(f"{name:<8}{keyset_ms:>11.2f}{keyset_buffers:>9}{offset_ms:>11.2f}{offset_buffers:>9}")
+
+    stream_ms, events = timed(lambda: list(stream_timeline(cursor, match_id, page_size=page_size)))
+    range_ms, range_events = timed(lambda: list(stream_timeline(cursor, match_id, 60, 75, page_size=page_size)))
+    fetch_ms, sorted_events = timed(fetch_all_and_sort, cursor, match_id)
+    print(f"Stream whole match:      {stream_ms:8.1f} ms ({len(events)} events)")
+    print(f"Stream minutes 60-75:    {range_ms:8.1f} ms ({len(range_events)} events)")
+    print(f"Fetch all + client sort: {fetch_ms:8.1f} ms ({len(sorted_events)} events)")
+    if len(events) != event_count:
+        print(f"[WARNING] Streamed {len(events)} of {event_count} events")
+
+    conn.rollback()
+    cursor.close()
+    conn.close()
+
+if __name__ == "__main__":
+    run_benchmark(db_parameters)
@@ -0,0 +1,71 @@
+'''
+connection_pools.py
+=========================================================
+Connection pools for the query harness, one per database (conninfo). Pooled
+connections are health-checked when they are handed out again, and time
+spent establishing connections and waiting for them is tracked separately
+from query time.
+
+A pool has to be closed before its database is dropped (see queries.py
+load_database); its statistics are kept for the final report.
+=========================================================
+'''
+
+import time
+from collections import Counter
+from psycopg_pool import ConnectionPool
+
+pool_max_size = 4
+
+_pools = {}
+_owners = {}
+_closed_stats = Counter()
+_acquire_seconds = 0.0
+
+def get_pool(conninfo):
+    pool = _pools.get(conninfo)
+    if pool is None:
+        pool = ConnectionPool(conninfo, min_size=1, max_size=pool_max_size,
+                              check=ConnectionPool.check_connection, open=True)
+        _pools[conninfo] = pool
+    return pool
+
+# Take a connection from the pool for conninfo, opening the pool if needed
+def getconn(conninfo):
+    global _acquire_seconds
+    start = time.perf_counter()
+    pool = get_pool(conninfo)
+    conn = pool.getconn()
+    _acquire_seconds += time.perf_counter() - start
+    _owners[id(conn)] = pool
+    return conn
+
+# Return a connection to the pool it came from (or close it if that pool is gone)
+def release(conn):
+    pool = _owners.pop(id(conn), None)
+    if pool is not None and not pool.closed:
+        pool.putconn(conn)
+    else:
+        conn.close()
+
+def close_pool(conninfo):
+    pool = _pools.pop(conninfo, None)
+    if pool is not None:
+        _closed_stats.update(pool.get_stats())
+        pool.close()
+
+def close_all():
+    for conninfo in list(_pools):
+        close_pool(conninfo)
+
+# Connection setup and acquire times in ms, over open and closed pools
+def connection_report():
+    stats = Counter(_closed_stats)
+    for pool in _pools.values():
+        stats.update(pool.get_stats())
+    return {
+        'connections_opened': stats.get('connections_num', 0),
+        'connection_setup_ms': stats.get('connections_ms', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+        'acquire_ms': _acquire_seconds * 1000,
+    }
@@ -0,0 +1,226 @@
+import json
+import os
+import sys
+import time
+import raw_store
+from db import connect
+from event_links import create_event_relations_table
+from fact_tables import create_fact_tables, FACT_TABLES
+from timeline import create_timeline_index
+from on_pitch import create_lineup_spells_table
+from json_loader_source import (load_competitions_to_db, load_all_match_data, load_all_events_data,
+                                load_all_lineups_data, ensure_content_hash_columns, db_parameters)
+
+# Full-rebuild mode for the loader. While loading, the big tables are
+# UNLOGGED (no WAL), their secondary indexes are dropped and the foreign keys
+# on and into them are dropped, so every insert only maintains the table and
+# its primary key / unique indexes (which ON CONFLICT needs). Afterwards the
+# tables are switched back to LOGGED, the indexes are rebuilt and the foreign
+# keys are re-added and validated, leaving the same schema as a normal load.
+#
+# Postgres cannot defer NOT NULL / CHECK constraints, and foreign keys only
+# if they were declared DEFERRABLE, so "deferred" here means dropped and
+# re-added as NOT VALID followed by VALIDATE CONSTRAINT, which checks every
+# row in one pass instead of one lookup per insert.
+#
+# SET LOGGED rewrites the table and all of its indexes, so it runs before the
+# secondary indexes are built rather than after. Logged tables cannot
+# reference unlogged ones, so the foreign keys are added last.
+#
+# What was dropped is saved to bulk_load_state.json before anything is
+# dropped; if a load fails, `python bulk_load.py --restore` finishes the job.
+#
+# A bulk load rebuilds the tables from the files, so it refuses to start if
+# any of them holds rows, unless run with --truncate, which empties them
+# (TRUNCATE, after the foreign keys are dropped) before loading.
+
+BULK_TABLES = ['matches', 'players', 'events', 'lineups', 'lineup_spells', 'event_relations'] + [
+    table for table, _, _ in FACT_TABLES.values()]
+
+state_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'bulk_load_state.json')
+
+# Non-unique indexes that back no constraint
+SECONDARY_INDEXES_QUERY = """
+    SELECT c.relname, i.relname, pg_get_indexdef(x.indexrelid)
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_class c ON c.oid = x.indrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = current_schema() AND c.relname = ANY(%s)
+      AND NOT x.indisunique
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint con WHERE con.conindid = x.indexrelid AND con.contype <> 'f')
+    ORDER BY c.relname, i.relname;
+"""
+
+# Foreign keys on the bulk tables and those referencing them from other tables
+FOREIGN_KEYS_QUERY = """
+    SELECT c.relname, con.conname, pg_get_constraintdef(con.oid)
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    JOIN pg_class r ON r.oid = con.confrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE con.contype = 'f' AND n.nspname = current_schema()
+      AND (c.relname = ANY(%s) OR r.relname = ANY(%s))
+    ORDER BY c.relname, con.conname;
+"""
+
+class BulkLoadError(RuntimeError):
+    pass
+
+class PhaseTimer:
+    def __init__(self):
+        self.phases = []
+
+    def run(self, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.phases.append((name, time.perf_counter() - start))
+        return result
+
+    def report(self):
+        total = sum(seconds for _, seconds in self.phases)
+        print(f"{'phase':<40}{'seconds':>10}{'share':>8}")
+        for name, seconds in self.phases:
+            print(f"{name:<40}{seconds:>10.2f}{(seconds / total if total else 0):>8.1%}")
+        print(f"{'total':<40}{total:>10.2f}")
+
+def capture_state(cursor, tables):
+    cursor.execute(SECONDARY_INDEXES_QUERY, (tables,))
+    indexes = [list(row) for row in cursor.fetchall()]
+    cursor.execute(FOREIGN_KEYS_QUERY, (tables, tables))
+    foreign_keys = [list(row) for row in cursor.fetchall()]
+    return {'tables': tables, 'indexes': indexes, 'foreign_keys': foreign_keys}
+
+def save_state(state):
+    with open(state_file, 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=2)
+
+def load_state():
+    with open(state_file, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+# Create everything the loaders would create, so its indexes are captured and
+# dropped too instead of being created during the load
+def ensure_schema(conn):
+    cursor = conn.cursor()
+    create_event_relations_table(cursor)
+    create_fact_tables(cursor)
+    create_timeline_index(cursor)
+    create_lineup_spells_table(cursor)
+    ensure_content_hash_columns(cursor)
+    conn.commit()
+    cursor.close()
+
+# Bulk tables that hold at least one row
+def non_empty_tables(cursor, tables):
+    non_empty = []
+    for table in tables:
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table});")
+        if cursor.fetchone()[0]:
+            non_empty.append(table)
+    return non_empty
+
+def prepare_bulk_load(conn, state, truncate=False):
+    cursor = conn.cursor()
+    for table, name, _ in state['foreign_keys']:
+        cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS "{name}";')
+    for _, name, _ in state['indexes']:
+        cursor.execute(f'DROP INDEX IF EXISTS "{name}";')
+    if truncate:
+        cursor.execute(f"TRUNCATE {', '.join(state['tables'])};")
+    for table in state['tables']:
+        cursor.execute(f"ALTER TABLE {table} SET UNLOGGED;")
+    conn.commit()
+    cursor.close()
+
+def set_logged(conn, table):
+    with conn.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} SET LOGGED;")
+    conn.commit()
+
+def rebuild_index(conn, definition):
+    with conn.cursor() as cursor:
+        cursor.execute(definition.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1) + ';')
+    conn.commit()
+
+def add_foreign_key(conn, table, name, definition):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s AND conrelid = %s::regclass;", (name, table))
+        if cursor.fetchone() is None:
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition} NOT VALID;')
+    conn.commit()
+
+def validate_foreign_key(conn, table, name):
+    with conn.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT "{name}";')
+    conn.commit()
+
+def analyze_tables(conn, tables):
+    with conn.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f"ANALYZE {table};")
+    conn.commit()
+
+# Undo prepare_bulk_load: logged tables, indexes, then validated foreign keys
+def finish_bulk_load(conn, state, timer):
+    for table in state['tables']:
+        timer.run(f"set logged {table}", set_logged, conn, table)
+    for _, name, definition in state['indexes']:
+        timer.run(f"rebuild index {name}", rebuild_index, conn, definition)
+    for table, name, definition in state['foreign_keys']:
+        timer.run(f"add foreign key {name}", add_foreign_key, conn, table, name, definition)
+    for table, name, _ in state['foreign_keys']:
+        timer.run(f"validate foreign key {name}", validate_foreign_key, conn, table, name)
+    timer.run("analyze", analyze_tables, conn, state['tables'])
+    os.remove(state_file)
+
+def bulk_load(db_params, data_dir='data', truncate=False):
+    if os.path.exists(state_file):
+        raise BulkLoadError(f"{state_file} exists: a previous bulk load did not finish, run with --restore first")
+    timer = PhaseTimer()
+    conn = connect(db_params)
+
+    timer.run("prepare: create schema", ensure_schema, conn)
+    with conn.cursor() as cursor:
+        non_empty = non_empty_tables(cursor, BULK_TABLES)
+        state = capture_state(cursor, BULK_TABLES)
+    conn.commit()
+    if non_empty and not truncate:
+        conn.close()
+        raise BulkLoadError(f"{', '.join(non_empty)} not empty: a bulk load rebuilds them from the files, "
+                            f"run with --truncate to empty them first")
+    save_state(state)
+    timer.run("prepare: drop indexes, keys, set unlogged", prepare_bulk_load, conn, state, truncate)
+    print(f"Dropped {len(state['indexes'])} indexes and {len(state['foreign_keys'])} foreign keys, "
+          f"{len(state['tables'])} tables unlogged" + (", truncated" if truncate else ""))
+
+    competitions_path = raw_store.find_data_file(f'{data_dir}/competitions') or f'{data_dir}/competitions.json'
+    timer.run("load competitions", load_competitions_to_db, competitions_path, db_params)
+    timer.run("load matches", load_all_match_data, db_params, data_dir)
+    timer.run("load events", load_all_events_data, db_params, data_dir, False)
+    timer.run("load lineups", load_all_lineups_data, db_params, data_dir, False)
+
+    finish_bulk_load(conn, state, timer)
+    conn.close()
+    timer.report()
+
+def restore(db_params):
+    timer = PhaseTimer()
+    conn = connect(db_params)
+    finish_bulk_load(conn, load_state(), timer)
+    conn.close()
+    timer.report()
+
+# USAGE (from json_loader/):  python bulk_load.py [--truncate] [data_dir]   or   python bulk_load.py --restore
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        if args == ['--restore']:
+            restore(db_parameters)
+        else:
+            truncate = '--truncate' in args
+            args = [arg for arg in args if arg != '--truncate']
+            bulk_load(db_parameters, args[0] if args else 'data', truncate)
+    except BulkLoadError as error:
+        print(error)
+        sys.exit(1)
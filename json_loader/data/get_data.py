@@ -1,34 +1,69 @@
 import requests
 import os
+import sys
 import psycopg2
 
+# raw_store.py lives in json_loader/, one level up from this script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import raw_store
+
+# Format downloads are stored in: None (plain .json, the default), 'gzip'
+# (.json.gz) or 'zstd' (.json.zst, needs the zstandard package). The loader
+# reads all three. Compression is opt-in: existing plain files are left alone.
+compression = None
+
+# Write a downloaded file, compressing it as it is written. It is written to
+# a temporary file first and moved into place once complete, so a failed
+# download never leaves a truncated file for the loader to pick up. Compressed
+# copies of the same file in the other format (written by an earlier download)
+# are removed; a plain .json is never removed, and since the loader reads it
+# ahead of a compressed copy, a warning says so.
+def save_download(response, file_path, compression):
+    temp_path = file_path + '.part'
+    try:
+        with raw_store.open_for_write(temp_path, compression) as file:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                file.write(chunk)
+        os.replace(temp_path, file_path)
+        base_path = file_path[:-len(raw_store.COMPRESSION_SUFFIXES[compression])]
+        for stored in ('gzip', 'zstd'):
+            stale_path = raw_store.data_file_path(base_path, stored)
+            if stale_path != file_path and os.path.exists(stale_path):
+                os.remove(stale_path)
+        plain_path = raw_store.data_file_path(base_path)
+        if plain_path != file_path and os.path.exists(plain_path):
+            print(f'[WARNING] {plain_path} exists and is read instead of {file_path}')
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
 # Download match data
-def download_matches_data(competitions, base_url):
+def download_matches_data(competitions, base_url, compression=None):
     for comp in competitions:
         comp_id = comp['competition_id']
         season_id = comp['season_id']
 
         # The file path and directory path
-        file_path = f'data/matches/{comp_id}/{season_id}.json'
+        source_path = f'data/matches/{comp_id}/{season_id}.json'
+        file_path = raw_store.data_file_path(f'data/matches/{comp_id}/{season_id}', compression)
         dir_path = os.path.dirname(file_path)
 
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
 
         # Full URL to the file
-        file_url = f'{base_url}{file_path}'
+        file_url = f'{base_url}{source_path}'
 
         # Download the file
-        response = requests.get(file_url)
-        if response.status_code == 200:
-            with open(file_path, 'wb') as file:
-                file.write(response.content)
-            print(f'Downloaded {file_path}')
-        else:
-            print(f'Failed to download {file_path}: HTTP {response.status_code}')
+        with requests.get(file_url, stream=True) as response:
+            if response.status_code == 200:
+                save_download(response, file_path, compression)
+                print(f'Downloaded {file_path}')
+            else:
+                print(f'Failed to download {file_path}: HTTP {response.status_code}')
 
 # Download event data
-def download_events_data(db_params, base_url):
+def download_events_data(db_params, base_url, compression=None):
     # Connect to the database
     conn = psycopg2.connect(**db_params)
     cursor = conn.cursor()
@@ -40,7 +75,7 @@ def download_events_data(db_params, base_url):
     for match_id in match_ids:
         # Format match_id and construct file path
         match_id_str = str(match_id[0])
-        file_path = f'data/events/{match_id_str}.json'
+        file_path = raw_store.data_file_path(f'data/events/{match_id_str}', compression)
         dir_path = os.path.dirname(file_path)
 
         if not os.path.exists(dir_path):
@@ -50,20 +85,19 @@ def download_events_data(db_params, base_url):
         file_url = f'{base_url}data/events/{match_id_str}.json'
 
         # Download the file
-        response = requests.get(file_url)
-        if response.status_code == 200:
-            with open(file_path, 'wb') as file:
-                file.write(response.content)
-            print(f'Downloaded events data for match_id {match_id_str}')
-        else:
-            print(f'Failed to download data for match_id {match_id_str}: HTTP {response.status_code}')
+        with requests.get(file_url, stream=True) as response:
+            if response.status_code == 200:
+                save_download(response, file_path, compression)
+                print(f'Downloaded events data for match_id {match_id_str}')
+            else:
+                print(f'Failed to download data for match_id {match_id_str}: HTTP {response.status_code}')
 
     # Close the database connection
     cursor.close()
     conn.close()
 
 # download Lineup data
-def download_lineups_data(db_params, base_url):
+def download_lineups_data(db_params, base_url, compression=None):
     # Connect to the database
     conn = psycopg2.connect(**db_params)
     cursor = conn.cursor()
@@ -75,7 +109,7 @@ def download_lineups_data(db_params, base_url):
     for match_id in match_ids:
         # Format match_id and construct file path
         match_id_str = str(match_id[0])
-        file_path = f'data/lineups/{match_id_str}.json'
+        file_path = raw_store.data_file_path(f'data/lineups/{match_id_str}', compression)
         dir_path = os.path.dirname(file_path)
 
         if not os.path.exists(dir_path):
@@ -85,13 +119,12 @@ def download_lineups_data(db_params, base_url):
         file_url = f'{base_url}data/lineups/{match_id_str}.json'
 
         # Download the file
-        response = requests.get(file_url)
-        if response.status_code == 200:
-            with open(file_path, 'wb') as file:
-                file.write(response.content)
-            print(f'Downloaded lineups data for match_id {match_id_str}')
-        else:
-            print(f'Failed to download data for match_id {match_id_str}: HTTP {response.status_code}')
+        with requests.get(file_url, stream=True) as response:
+            if response.status_code == 200:
+                save_download(response, file_path, compression)
+                print(f'Downloaded lineups data for match_id {match_id_str}')
+            else:
+                print(f'Failed to download data for match_id {match_id_str}: HTTP {response.status_code}')
 
     # Close the database connection
     cursor.close()
@@ -110,6 +143,6 @@ db_parameters = {
     'password': '1234',
     'host': 'localhost'
 }
-# download_matches_data(competitions, base_url)
-# download_events_data(db_parameters, base_url)
-download_lineups_data(db_parameters, base_url)
\ No newline at end of file
+# download_matches_data(competitions, base_url, compression)
+# download_events_data(db_parameters, base_url, compression)
+download_lineups_data(db_parameters, base_url, compression)
\ No newline at end of file
@@ -0,0 +1,43 @@
+import contextlib
+import psycopg
+
+# Shared psycopg 3 connection layer for the loader.
+#
+# Statements run more than prepare_threshold times on a connection are
+# prepared server-side, so the repeated upserts are parsed and planned once.
+# Inside pipelined(), statements that return nothing are queued and sent
+# without waiting for each result, so many of them share one round trip;
+# reading a result (fetchone/fetchall) flushes the queue first.
+
+# Prepare a statement on its second execution
+default_prepare_threshold = 1
+
+def connect(db_params, prepare_threshold=default_prepare_threshold, **kwargs):
+    return psycopg.connect(**db_params, prepare_threshold=prepare_threshold, **kwargs)
+
+# Run a block in pipeline mode on the cursor's connection, or normally when
+# use_pipeline is False (used to measure the difference)
+@contextlib.contextmanager
+def pipelined(cursor, use_pipeline=True):
+    if not use_pipeline:
+        yield
+        return
+    with cursor.connection.pipeline():
+        yield
+
+# Row returned by each statement of executemany(..., returning=True), None when
+# a statement returned nothing
+def returned_rows(cursor):
+    while True:
+        yield cursor.fetchone()
+        if not cursor.nextset():
+            break
+
+# Channel notified when the loader commits new data; readers that cache query
+# results (stats_service.py) LISTEN on it and drop their cache. Notifications
+# are only delivered if and when the transaction commits.
+data_changed_channel = 'stats_data_changed'
+
+def commit_and_notify(conn):
+    conn.execute(f"NOTIFY {data_changed_channel}")
+    conn.commit()
@@ -0,0 +1,106 @@
+# Edge table for the related_events links of every event. Each link is stored
+# once per direction it appears in the source data, so a Pass -> Ball Receipt
+# lookup and a Ball Receipt -> Pass lookup are both plain index scans.
+EVENT_RELATIONS_DDL = ["""
+    CREATE TABLE IF NOT EXISTS event_relations (
+        event_id UUID NOT NULL,
+        related_event_id UUID NOT NULL,
+        PRIMARY KEY (event_id, related_event_id)
+    );
+""", """
+    CREATE INDEX IF NOT EXISTS event_relations_related_event_id_idx
+        ON event_relations (related_event_id, event_id);
+"""]
+
+# Pass -> Ball Receipt join for one season using the edge table
+PASS_RECEIPT_QUERY = """
+    SELECT p.event_id AS pass_id, p.player_id AS passer_id,
+           r.event_id AS receipt_id, r.player_id AS receiver_id
+    FROM events p
+    JOIN matches m ON p.match_id = m.match_id
+    JOIN event_relations er ON er.event_id = p.event_id
+    JOIN events r ON r.event_id = er.related_event_id
+    WHERE m.competition_id = %s AND m.season_id = %s
+      AND p.type_id = (SELECT type_id FROM event_types WHERE name = 'Pass')
+      AND r.type_id = (SELECT type_id FROM event_types WHERE name = 'Ball Receipt*');
+"""
+
+# The same join done by parsing the related_events JSON text of every pass
+PASS_RECEIPT_JSON_QUERY = """
+    SELECT p.event_id AS pass_id, p.player_id AS passer_id,
+           r.event_id AS receipt_id, r.player_id AS receiver_id
+    FROM events p
+    JOIN matches m ON p.match_id = m.match_id
+    CROSS JOIN LATERAL jsonb_array_elements_text(
+        CASE WHEN p.related_events::text = 'null' THEN '[]'::jsonb ELSE p.related_events::jsonb END
+    ) AS rel(related_event_id)
+    JOIN events r ON r.event_id = rel.related_event_id::uuid
+    WHERE m.competition_id = %s AND m.season_id = %s
+      AND p.type_id = (SELECT type_id FROM event_types WHERE name = 'Pass')
+      AND r.type_id = (SELECT type_id FROM event_types WHERE name = 'Ball Receipt*');
+"""
+
+def create_event_relations_table(cursor):
+    for statement in EVENT_RELATIONS_DDL:
+        cursor.execute(statement)
+
+# Build (event_id, related_event_id) edges from a match's raw events
+def event_relation_rows(events_data):
+    rows = []
+    for event in events_data:
+        for related_event_id in event.get('related_events') or []:
+            rows.append((event['id'], related_event_id))
+    return rows
+
+# Remove the edges of events that are about to be rewritten, so links dropped
+# from their related_events do not survive the re-ingest
+def delete_event_relations(event_ids, cursor):
+    if event_ids:
+        cursor.execute("DELETE FROM event_relations WHERE event_id = ANY(%s::uuid[]);", (list(event_ids),))
+
+# Insert all edges with one executemany, which psycopg sends as a pipeline
+def load_event_relations(rows, cursor):
+    if not rows:
+        return
+    cursor.executemany("""
+        INSERT INTO event_relations (event_id, related_event_id)
+        VALUES (%s, %s)
+        ON CONFLICT DO NOTHING;
+    """, rows)
+
+# Fill the edge table from events already in the database (e.g. a database
+# restored from dbexport.sql, which predates the edge table)
+def backfill_event_relations(cursor):
+    create_event_relations_table(cursor)
+    cursor.execute("""
+        INSERT INTO event_relations (event_id, related_event_id)
+        SELECT e.event_id, rel.related_event_id::uuid
+        FROM events e
+        CROSS JOIN LATERAL jsonb_array_elements_text(
+            CASE WHEN e.related_events::text = 'null' THEN '[]'::jsonb ELSE e.related_events::jsonb END
+        ) AS rel(related_event_id)
+        ON CONFLICT DO NOTHING;
+    """)
+    return cursor.rowcount
+
+# Follow links from the given events, optionally only to events of one type.
+# Returns (event_id, related_event_id, related_type_name) rows.
+def follow_event_links(cursor, event_ids, type_name=None):
+    query = """
+        SELECT er.event_id, er.related_event_id, et.name
+        FROM event_relations er
+        JOIN events r ON r.event_id = er.related_event_id
+        JOIN event_types et ON r.type_id = et.type_id
+        WHERE er.event_id = ANY(%s::uuid[])
+    """
+    params = [list(event_ids)]
+    if type_name is not None:
+        query += " AND et.name = %s"
+        params.append(type_name)
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+# Every Pass in a season paired with the Ball Receipt it links to
+def pass_receipts(cursor, competition_id, season_id):
+    cursor.execute(PASS_RECEIPT_QUERY, (competition_id, season_id))
+    return cursor.fetchall()
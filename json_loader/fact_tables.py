@@ -0,0 +1,309 @@
+# Per-event-type fact tables with typed, indexed columns taken from the
+# matching detail object (event['shot'], event['pass'], ...). They are written
+# alongside the generic events table, which stays as it is. Boolean flags that
+# StatsBomb omits when false are stored as NULL when absent, so
+# "flag IS NOT NULL" / "flag IS TRUE" behave like the JSON casts they replace.
+
+FACT_TABLES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS shots (
+        event_id UUID PRIMARY KEY,
+        match_id INTEGER NOT NULL,
+        player_id INTEGER,
+        team_id INTEGER,
+        statsbomb_xg DOUBLE PRECISION,
+        first_time BOOLEAN,
+        one_on_one BOOLEAN,
+        outcome_id INTEGER,
+        technique_id INTEGER,
+        body_part_id INTEGER,
+        shot_type_id INTEGER,
+        key_pass_id UUID
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS shots_match_id_player_id_idx ON shots (match_id, player_id);",
+    """
+    CREATE TABLE IF NOT EXISTS passes (
+        event_id UUID PRIMARY KEY,
+        match_id INTEGER NOT NULL,
+        player_id INTEGER,
+        team_id INTEGER,
+        recipient_id INTEGER,
+        length DOUBLE PRECISION,
+        angle DOUBLE PRECISION,
+        through_ball BOOLEAN,
+        cross_pass BOOLEAN,
+        switch BOOLEAN,
+        shot_assist BOOLEAN,
+        goal_assist BOOLEAN,
+        outcome_id INTEGER,
+        height_id INTEGER,
+        body_part_id INTEGER,
+        pass_type_id INTEGER,
+        technique_id INTEGER
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS passes_match_id_player_id_idx ON passes (match_id, player_id);",
+    "CREATE INDEX IF NOT EXISTS passes_match_id_recipient_id_idx ON passes (match_id, recipient_id);",
+    """
+    CREATE TABLE IF NOT EXISTS dribbles (
+        event_id UUID PRIMARY KEY,
+        match_id INTEGER NOT NULL,
+        player_id INTEGER,
+        team_id INTEGER,
+        outcome_id INTEGER,
+        nutmeg BOOLEAN,
+        overrun BOOLEAN,
+        no_touch BOOLEAN
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS dribbles_match_id_player_id_idx ON dribbles (match_id, player_id);",
+    """
+    CREATE TABLE IF NOT EXISTS dribbled_past (
+        event_id UUID PRIMARY KEY,
+        match_id INTEGER NOT NULL,
+        player_id INTEGER,
+        team_id INTEGER,
+        counterpress BOOLEAN
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS dribbled_past_match_id_player_id_idx ON dribbled_past (match_id, player_id);",
+]
+
+def _id(details, key):
+    value = details.get(key)
+    return value['id'] if value else None
+
+def _common(match_id, event):
+    return (event['id'], match_id, (event.get('player') or {}).get('id'), (event.get('team') or {}).get('id'))
+
+def shot_row(match_id, event):
+    shot = event.get('shot') or {}
+    return _common(match_id, event) + (
+        shot.get('statsbomb_xg'), shot.get('first_time'), shot.get('one_on_one'), _id(shot, 'outcome'),
+        _id(shot, 'technique'), _id(shot, 'body_part'), _id(shot, 'type'), shot.get('key_pass_id'))
+
+def pass_row(match_id, event):
+    pass_details = event.get('pass') or {}
+    return _common(match_id, event) + (
+        _id(pass_details, 'recipient'), pass_details.get('length'), pass_details.get('angle'),
+        pass_details.get('through_ball'), pass_details.get('cross'), pass_details.get('switch'),
+        pass_details.get('shot_assist'), pass_details.get('goal_assist'), _id(pass_details, 'outcome'),
+        _id(pass_details, 'height'), _id(pass_details, 'body_part'), _id(pass_details, 'type'),
+        _id(pass_details, 'technique'))
+
+def dribble_row(match_id, event):
+    dribble = event.get('dribble') or {}
+    return _common(match_id, event) + (
+        _id(dribble, 'outcome'), dribble.get('nutmeg'), dribble.get('overrun'), dribble.get('no_touch'))
+
+def dribbled_past_row(match_id, event):
+    return _common(match_id, event) + (event.get('counterpress'),)
+
+# Event type name -> (table, columns after the common ones, row builder)
+FACT_TABLES = {
+    'Shot': ('shots', ['statsbomb_xg', 'first_time', 'one_on_one', 'outcome_id', 'technique_id',
+                       'body_part_id', 'shot_type_id', 'key_pass_id'], shot_row),
+    'Pass': ('passes', ['recipient_id', 'length', 'angle', 'through_ball', 'cross_pass', 'switch',
+                        'shot_assist', 'goal_assist', 'outcome_id', 'height_id', 'body_part_id',
+                        'pass_type_id', 'technique_id'], pass_row),
+    'Dribble': ('dribbles', ['outcome_id', 'nutmeg', 'overrun', 'no_touch'], dribble_row),
+    'Dribbled Past': ('dribbled_past', ['counterpress'], dribbled_past_row),
+}
+
+COMMON_COLUMNS = ['event_id', 'match_id', 'player_id', 'team_id']
+
+def create_fact_tables(cursor):
+    for statement in FACT_TABLES_DDL:
+        cursor.execute(statement)
+
+def _upsert_query(table, columns):
+    all_columns = COMMON_COLUMNS + columns
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in all_columns[1:])
+    return f"""
+        INSERT INTO {table} ({", ".join(all_columns)})
+        VALUES ({", ".join(["%s"] * len(all_columns))})
+        ON CONFLICT (event_id) DO UPDATE SET {updates};
+    """
+
+# Remove the fact rows of events that are about to be rewritten, from every
+# fact table, since an updated event may no longer be of the same type
+def delete_fact_rows(event_ids, cursor):
+    if event_ids:
+        for table, _, _ in FACT_TABLES.values():
+            cursor.execute(f"DELETE FROM {table} WHERE event_id = ANY(%s::uuid[]);", (list(event_ids),))
+
+# Write the fact rows for a match's new or changed events
+def load_fact_rows(match_id, events_data, cursor):
+    rows = {type_name: [] for type_name in FACT_TABLES}
+    for event in events_data:
+        type_name = event['type']['name']
+        if type_name in FACT_TABLES:
+            rows[type_name].append(FACT_TABLES[type_name][2](match_id, event))
+
+    for type_name, (table, columns, _) in FACT_TABLES.items():
+        if rows[type_name]:
+            cursor.executemany(_upsert_query(table, columns), rows[type_name])
+
+# Fill the fact tables from events already in the database (e.g. a database
+# restored from dbexport.sql, which predates them)
+BACKFILL_QUERIES = [
+    """
+    INSERT INTO shots
+    SELECT e.event_id, e.match_id, e.player_id, e.team_id,
+           (d->>'statsbomb_xg')::float, (d->>'first_time')::boolean, (d->>'one_on_one')::boolean,
+           (d->'outcome'->>'id')::integer, (d->'technique'->>'id')::integer,
+           (d->'body_part'->>'id')::integer, (d->'type'->>'id')::integer, (d->>'key_pass_id')::uuid
+    FROM events e JOIN event_types et ON e.type_id = et.type_id
+    CROSS JOIN LATERAL (SELECT e.event_details::jsonb AS d) details
+    WHERE et.name = 'Shot'
+    ON CONFLICT (event_id) DO NOTHING;
+    """,
+    """
+    INSERT INTO passes
+    SELECT e.event_id, e.match_id, e.player_id, e.team_id,
+           (d->'recipient'->>'id')::integer, (d->>'length')::float, (d->>'angle')::float,
+           (d->>'through_ball')::boolean, (d->>'cross')::boolean, (d->>'switch')::boolean,
+           (d->>'shot_assist')::boolean, (d->>'goal_assist')::boolean, (d->'outcome'->>'id')::integer,
+           (d->'height'->>'id')::integer, (d->'body_part'->>'id')::integer, (d->'type'->>'id')::integer,
+           (d->'technique'->>'id')::integer
+    FROM events e JOIN event_types et ON e.type_id = et.type_id
+    CROSS JOIN LATERAL (SELECT e.event_details::jsonb AS d) details
+    WHERE et.name = 'Pass'
+    ON CONFLICT (event_id) DO NOTHING;
+    """,
+    """
+    INSERT INTO dribbles
+    SELECT e.event_id, e.match_id, e.player_id, e.team_id,
+           (d->'outcome'->>'id')::integer, (d->>'nutmeg')::boolean, (d->>'overrun')::boolean,
+           (d->>'no_touch')::boolean
+    FROM events e JOIN event_types et ON e.type_id = et.type_id
+    CROSS JOIN LATERAL (SELECT e.event_details::jsonb AS d) details
+    WHERE et.name = 'Dribble'
+    ON CONFLICT (event_id) DO NOTHING;
+    """,
+    # counterpress is an event-level field that the events table does not keep
+    """
+    INSERT INTO dribbled_past (event_id, match_id, player_id, team_id)
+    SELECT e.event_id, e.match_id, e.player_id, e.team_id
+    FROM events e JOIN event_types et ON e.type_id = et.type_id
+    WHERE et.name = 'Dribbled Past'
+    ON CONFLICT (event_id) DO NOTHING;
+    """,
+]
+
+def backfill_fact_tables(cursor):
+    create_fact_tables(cursor)
+    for query in BACKFILL_QUERIES:
+        cursor.execute(query)
+    for table, _, _ in FACT_TABLES.values():
+        cursor.execute(f"ANALYZE {table};")
+
+# Q_n rewritten against the fact tables. Each keeps the joins and filters of
+# its queries.py counterpart, so the results are identical.
+FACT_QUERIES = {
+    1: """
+    SELECT p.name AS player_name, AVG(s.statsbomb_xg) AS average_xg
+    FROM shots s
+    JOIN players p ON s.player_id = p.player_id
+    JOIN matches m ON s.match_id = m.match_id
+    JOIN competitions c ON m.competition_id = c.competition_id AND m.season_id = c.season_id
+    WHERE c.competition_name = 'La Liga' AND c.season_name = '2020/2021' AND s.statsbomb_xg IS NOT NULL
+    GROUP BY p.name
+    HAVING AVG(s.statsbomb_xg) > 0
+    ORDER BY average_xg DESC;
+    """,
+    2: """
+    SELECT p.name AS player_name, COUNT(s.event_id) AS number_of_shots
+    FROM shots s
+    JOIN players p ON s.player_id = p.player_id
+    JOIN matches m ON s.match_id = m.match_id
+    JOIN competitions c ON m.competition_id = c.competition_id
+    WHERE c.competition_name = 'La Liga' AND c.season_name = '2020/2021'
+    GROUP BY p.name
+    ORDER BY number_of_shots DESC;
+    """,
+    3: """
+    SELECT p.name AS player_name, COUNT(s.event_id) AS first_time_shots
+    FROM shots s
+    JOIN players p ON s.player_id = p.player_id
+    JOIN matches m ON s.match_id = m.match_id
+    JOIN competitions c ON m.competition_id = c.competition_id
+    WHERE c.competition_name = 'La Liga' AND c.season_name IN ('2018/2019', '2019/2020', '2020/2021')
+      AND s.first_time IS TRUE
+    GROUP BY p.name
+    ORDER BY first_time_shots DESC;
+    """,
+    4: """
+    SELECT t.name, COUNT(*) AS total_passes
+    FROM passes ps
+    JOIN matches m ON ps.match_id = m.match_id
+    JOIN teams t ON ps.team_id = t.team_id
+    WHERE m.competition_id = 11 AND m.season_id = 90
+    GROUP BY t.name
+    HAVING COUNT(*) > 0
+    ORDER BY total_passes DESC;
+    """,
+    5: """
+    SELECT p.name AS player_name, COUNT(*) AS number_of_passes_received
+    FROM passes ps
+    JOIN matches m ON ps.match_id = m.match_id
+    JOIN players p ON ps.recipient_id = p.player_id
+    WHERE m.competition_id = (SELECT competition_id FROM competitions WHERE competition_name = 'Premier League' AND season_name = '2003/2004')
+    GROUP BY p.name
+    HAVING COUNT(*) > 0
+    ORDER BY number_of_passes_received DESC;
+    """,
+    6: """
+    SELECT t.name AS team_name, COUNT(s.event_id) AS shots
+    FROM shots s
+    JOIN teams t ON s.team_id = t.team_id
+    JOIN matches m ON s.match_id = m.match_id
+    JOIN competitions c ON m.competition_id = c.competition_id
+    WHERE c.competition_name = 'Premier League' AND c.season_name = '2003/2004'
+    GROUP BY t.name
+    HAVING COUNT(s.event_id) > 0
+    ORDER BY shots DESC;
+    """,
+    7: """
+    SELECT p.name AS player_name, COUNT(*) AS through_balls
+    FROM passes ps
+    JOIN players p ON ps.player_id = p.player_id
+    JOIN matches m ON ps.match_id = m.match_id
+    WHERE ps.through_ball IS NOT NULL AND m.competition_id = 11 AND m.season_id = 90
+    GROUP BY p.name
+    HAVING COUNT(*) > 0
+    ORDER BY through_balls DESC;
+    """,
+    8: """
+    SELECT t.name AS team_name, COUNT(*) AS through_balls
+    FROM passes ps
+    JOIN teams t ON ps.team_id = t.team_id
+    JOIN matches m ON ps.match_id = m.match_id
+    WHERE ps.through_ball IS NOT NULL AND m.competition_id = 11 AND m.season_id = 90
+    GROUP BY t.name
+    HAVING COUNT(*) > 0
+    ORDER BY through_balls DESC;
+    """,
+    9: """
+    SELECT p.name, COUNT(*) AS succesful_dribbles
+    FROM dribbles d
+    JOIN players p ON p.player_id = d.player_id
+    JOIN matches m ON d.match_id = m.match_id
+    JOIN competitions c ON c.competition_name = 'La Liga' AND m.competition_id = c.competition_id
+    WHERE d.outcome_id IS NOT NULL
+    GROUP BY p.name
+    HAVING COUNT(*) > 0
+    ORDER BY succesful_dribbles DESC;
+    """,
+    10: """
+    SELECT p.name AS player_name, COUNT(*) AS dribble_past
+    FROM dribbled_past dp
+    JOIN players p ON dp.player_id = p.player_id
+    JOIN matches m ON dp.match_id = m.match_id
+    WHERE m.competition_id = 11 AND m.season_id = 90
+    GROUP BY p.name
+    HAVING COUNT(*) > 0
+    ORDER BY dribble_past DESC;
+    """,
+}
@@ -0,0 +1,38 @@
+import json
+import os
+import raw_store
+
+# JSON codec used by the loader. Decoding goes through orjson when it is
+# installed (set JSON_CODEC=json to force the standard library); it returns
+# the same Python objects as json.loads, in the same key order.
+#
+# Encoding always uses the standard library: orjson (like the other fast
+# encoders) cannot reproduce json.dumps' ", " / ": " separators, ASCII
+# escaping and float formatting, and the JSON stored in events must stay
+# byte-identical.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None and os.environ.get('JSON_CODEC', 'orjson') != 'json':
+    backend = 'orjson'
+    loads = orjson.loads
+else:
+    backend = 'json'
+    loads = json.loads
+
+# Read files in binary mode: orjson decodes UTF-8 bytes directly. The whole
+# (decompressed) document is read before decoding; neither decoder parses
+# incrementally
+def load(file):
+    return loads(file.read())
+
+# Plain or compressed (.json.gz / .json.zst) file, see raw_store.py
+def load_path(file_path):
+    with raw_store.open_data_file(file_path) as file:
+        return load(file)
+
+def dumps(obj):
+    return json.dumps(obj)
@@ -1,48 +1,101 @@
+import hashlib
 import json
 import os
-import psycopg2
+import sys
+from collections import Counter
 import pandas as pd
+import json_codec
+import raw_store
+from db import connect, pipelined, returned_rows, commit_and_notify
+from event_links import create_event_relations_table, event_relation_rows, load_event_relations, delete_event_relations
+from fact_tables import create_fact_tables, load_fact_rows, delete_fact_rows
+from timeline import create_timeline_index
+from on_pitch import create_lineup_spells_table, spell_rows, load_spell_ends, close_open_spells, load_lineup_spells
+
+# Hash of a row's column values, stored in content_hash so re-ingest can skip
+# rows whose content has not changed
+def row_content_hash(values):
+    return hashlib.md5(json.dumps(values, default=str).encode('utf-8')).hexdigest()
+
+# Add the content_hash column to tables loaded with change detection
+def ensure_content_hash_columns(cursor):
+    for table in ('competitions', 'matches', 'events', 'lineups'):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_hash TEXT;")
+
+# Run a guarded upsert for every row and record the outcomes. Rows skipped by
+# the WHERE clause of ON CONFLICT DO UPDATE return nothing; xmax = 0 marks a
+# fresh insert.
+def run_counted_upserts(cursor, query, rows, counts):
+    if not rows:
+        return
+    cursor.executemany(query, rows, returning=True)
+    for result in returned_rows(cursor):
+        if result is None:
+            counts['unchanged'] += 1
+        elif result[0]:
+            counts['inserted'] += 1
+        else:
+            counts['updated'] += 1
+
+def print_change_counts(table, counts):
+    print(f"{table}: {counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged")
 
 def load_competitions_to_db(json_filepath, db_params):
-    # Load JSON data
-    with open(json_filepath, 'r') as file:
-        data = json.load(file)
+    # Load JSON data (plain or compressed)
+    data = json_codec.load_path(json_filepath)
+
+    # Connect to the database
+    conn = connect(db_params)
+    cursor = conn.cursor()
+    ensure_content_hash_columns(cursor)
+
+    counts = load_competitions_data(data, cursor)
 
-    # Filter for the specified seasons
+    # Commit changes and close the connection
+    commit_and_notify(conn)
+    cursor.close()
+    conn.close()
+    print_change_counts('competitions', counts)
+    return counts
+
+# The specified seasons of competitions.json
+def filter_competitions(data):
     specified_seasons = ['La Liga 2020/2021', 'La Liga 2019/2020', 'La Liga 2018/2019', 'Premier League 2003/2004']
     filtered_data = [d for d in data if (
         (d['competition_name'] == 'La Liga' and d['season_name'] in ['2020/2021', '2019/2020', '2018/2019']) 
         or (d['competition_name'] == 'Premier League' and d['season_name'] == '2003/2004')
     )]
+    return filtered_data
 
+def load_competitions_data(competitions_data, cursor):
+    counts = Counter()
     # Convert to DataFrame for easier processing
-    df = pd.DataFrame(filtered_data)
+    df = pd.DataFrame(filter_competitions(competitions_data))
 
     # Select only the necessary columns
     df = df[['competition_id', 'season_id', 'competition_name', 'competition_gender', 'country_name', 'season_name', 'competition_youth', 'competition_international']]
 
-    # Connect to the database
-    conn = psycopg2.connect(**db_params)
-    cursor = conn.cursor()
-
-    # Insert data into the database
-    for _, row in df.iterrows():
-        cursor.execute("""
-            INSERT INTO competitions (competition_id, season_id, competition_name, competition_gender, country_name, season_name, competition_youth, competition_international) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (competition_id, season_id) DO UPDATE SET
-            competition_name = EXCLUDED.competition_name,
-            competition_gender = EXCLUDED.competition_gender,
-            country_name = EXCLUDED.country_name,
-            season_name = EXCLUDED.season_name,
-            competition_youth = EXCLUDED.competition_youth,
-            competition_international = EXCLUDED.competition_international;
-        """, (row.competition_id, row.season_id, row.competition_name, row.competition_gender, row.country_name, row.season_name, row.competition_youth, row.competition_international))
-
-    # Commit changes and close the connection
-    conn.commit()
-    cursor.close()
-    conn.close()
+    competition_rows = [(int(row.competition_id), int(row.season_id), row.competition_name, row.competition_gender,
+                         row.country_name, row.season_name, bool(row.competition_youth), bool(row.competition_international))
+                        for _, row in df.iterrows()]
+
+    # Insert the competitions, updating only those whose content hash changed
+    run_counted_upserts(cursor, """
+        INSERT INTO competitions (competition_id, season_id, competition_name, competition_gender, country_name, season_name, competition_youth, competition_international, content_hash)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (competition_id, season_id) DO UPDATE SET
+        competition_name = EXCLUDED.competition_name,
+        competition_gender = EXCLUDED.competition_gender,
+        country_name = EXCLUDED.country_name,
+        season_name = EXCLUDED.season_name,
+        competition_youth = EXCLUDED.competition_youth,
+        competition_international = EXCLUDED.competition_international,
+        content_hash = EXCLUDED.content_hash
+        WHERE competitions.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING (xmax = 0);
+    """, [competition_row + (row_content_hash(competition_row),) for competition_row in competition_rows], counts)
+
+    return counts
 
 def load_teams_data(matches_data, cursor):
     teams = set()
@@ -99,6 +152,8 @@ def load_competition_stages_data(matches_data, cursor):
         """, (stage_id, name))
 
 def load_matches_data(matches_data, cursor):
+    counts = Counter()
+    match_rows = []
     for match in matches_data:
         # Handle stadium and referee data
         stadium_id = match['stadium']['id'] if 'stadium' in match and match['stadium'] is not None else None
@@ -129,7 +184,9 @@ def load_matches_data(matches_data, cursor):
                         name = EXCLUDED.name,
                         nickname = EXCLUDED.nickname,
                         dob = EXCLUDED.dob,
-                        country_id = EXCLUDED.country_id;
+                        country_id = EXCLUDED.country_id
+                    WHERE (managers.name, managers.nickname, managers.dob, managers.country_id)
+                        IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.nickname, EXCLUDED.dob, EXCLUDED.country_id);
                 """, (
                     manager_id, manager['name'], manager.get('nickname'), 
                     manager['dob'], manager_country_id
@@ -138,14 +195,7 @@ def load_matches_data(matches_data, cursor):
             else:
                 manager_ids[manager_key] = None
 
-        # Insert or update the match data
-        cursor.execute("""
-            INSERT INTO matches (match_id, competition_id, season_id, match_date, kick_off, home_team_id, away_team_id, home_score, away_score, match_week, competition_stage_id, stadium_id, referee_id, home_manager_id, away_manager_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (match_id) DO UPDATE SET
-                home_manager_id = EXCLUDED.home_manager_id,
-                away_manager_id = EXCLUDED.away_manager_id;
-        """, (
+        match_rows.append((
             match['match_id'], match['competition']['competition_id'], match['season']['season_id'], 
             match['match_date'], match['kick_off'], match['home_team']['home_team_id'], 
             match['away_team']['away_team_id'], match['home_score'], match['away_score'], 
@@ -153,145 +203,231 @@ def load_matches_data(matches_data, cursor):
             manager_ids['home_manager_id'], manager_ids['away_manager_id']
         ))
 
+    # Insert the matches, updating only those whose content hash changed
+    run_counted_upserts(cursor, """
+            INSERT INTO matches (match_id, competition_id, season_id, match_date, kick_off, home_team_id, away_team_id, home_score, away_score, match_week, competition_stage_id, stadium_id, referee_id, home_manager_id, away_manager_id, content_hash)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (match_id) DO UPDATE SET
+                competition_id = EXCLUDED.competition_id,
+                season_id = EXCLUDED.season_id,
+                match_date = EXCLUDED.match_date,
+                kick_off = EXCLUDED.kick_off,
+                home_team_id = EXCLUDED.home_team_id,
+                away_team_id = EXCLUDED.away_team_id,
+                home_score = EXCLUDED.home_score,
+                away_score = EXCLUDED.away_score,
+                match_week = EXCLUDED.match_week,
+                competition_stage_id = EXCLUDED.competition_stage_id,
+                stadium_id = EXCLUDED.stadium_id,
+                referee_id = EXCLUDED.referee_id,
+                home_manager_id = EXCLUDED.home_manager_id,
+                away_manager_id = EXCLUDED.away_manager_id,
+                content_hash = EXCLUDED.content_hash
+            WHERE matches.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+            RETURNING (xmax = 0);
+        """, [match_row + (row_content_hash(match_row),) for match_row in match_rows], counts)
+
+    return counts
+
 
 # get ids & json data for matches
-def load_all_match_data(db_params):
+def load_all_match_data(db_params, data_dir='data'):
     # Connect to the database
-    conn = psycopg2.connect(**db_params)
+    conn = connect(db_params)
     cursor = conn.cursor()
+    ensure_content_hash_columns(cursor)
+    counts = Counter()
 
     # Get all competition_id and season_id pairs
     cursor.execute("SELECT competition_id, season_id FROM competitions")
     competition_season_pairs = cursor.fetchall()
 
     for competition_id, season_id in competition_season_pairs:
-        json_filepath = f'data/matches/{competition_id}/{season_id}.json'
+        base_path = f'{data_dir}/matches/{competition_id}/{season_id}'
+        json_filepath = raw_store.find_data_file(base_path) or f'{base_path}.json'
         
         # Load JSON data
         try:
-            with open(json_filepath, 'r') as file:
-                matches_data = json.load(file)
+            matches_data = json_codec.load_path(json_filepath)
 
-            # Call your data loading functions
-            load_teams_data(matches_data, cursor)
-            load_stadiums_data(matches_data, cursor)
-            load_referees_data(matches_data, cursor)
-            load_competition_stages_data(matches_data, cursor)
-            load_matches_data(matches_data, cursor)
+            # Call your data loading functions, sending each file's statements in pipeline mode
+            with pipelined(cursor):
+                load_teams_data(matches_data, cursor)
+                load_stadiums_data(matches_data, cursor)
+                load_referees_data(matches_data, cursor)
+                load_competition_stages_data(matches_data, cursor)
+                counts.update(load_matches_data(matches_data, cursor))
 
         except FileNotFoundError:
             print(f"File not found: {json_filepath}")
 
     # Commit changes and close the connection
-    conn.commit()
+    commit_and_notify(conn)
     cursor.close()
     conn.close()
+    print_change_counts('matches', counts)
+    return counts
 
 # get ids & json data for events
-def load_all_events_data(db_params):
+# (create_schema=False leaves the schema alone, e.g. while bulk_load.py has its indexes dropped)
+def load_all_events_data(db_params, data_dir='data', create_schema=True):
     print(os.getcwd())
     # Connect to the database
-    conn = psycopg2.connect(**db_params)
+    conn = connect(db_params)
     cursor = conn.cursor()
 
+    # Make sure the related events edge table, fact tables, timeline index and hash column exist
+    if create_schema:
+        create_event_relations_table(cursor)
+        create_fact_tables(cursor)
+        create_timeline_index(cursor)
+        ensure_content_hash_columns(cursor)
+    counts = Counter()
+
     # Retrieve all match_ids from the matches table
     cursor.execute("SELECT match_id FROM matches;")
     match_ids = cursor.fetchall()
 
     # Iterate over each match_id and load its events data
     for match_id in match_ids:
-        file_path = f'data/events/{match_id[0]}.json'
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as file:
-                events_data = json.load(file)
-                load_events_data(match_id[0], events_data, cursor)
+        file_path = raw_store.find_data_file(f'{data_dir}/events/{match_id[0]}')
+        if file_path:
+            events_data = json_codec.load_path(file_path)
+            with pipelined(cursor):
+                counts.update(load_events_data(match_id[0], events_data, cursor))
     # Commit changes and close the connection
-    conn.commit()
+    commit_and_notify(conn)
     cursor.close()
     conn.close()
+    print_change_counts('events', counts)
+    return counts
 
 # Insert data into the events and related tables
 def load_events_data(match_id, events_data, cursor):
+    counts = Counter()
+    changed_events = []
+    updated_event_ids = []
+    seen_type_ids = set()
+    seen_player_ids = set()
+
+    # Fetch the stored content hashes of this match's events in one query
+    cursor.execute("SELECT event_id, content_hash FROM events WHERE event_id = ANY(%s::uuid[]);",
+                   ([event['id'] for event in events_data],))
+    existing_hashes = {str(event_id): content_hash for event_id, content_hash in cursor.fetchall()}
+
     for event in events_data:
         # Extract and insert or ignore event_type
         type_id = event['type']['id']
         type_name = event['type']['name']
-        cursor.execute("INSERT INTO event_types (type_id, name) VALUES (%s, %s) ON CONFLICT (type_id) DO NOTHING;", (type_id, type_name))
+        if type_id not in seen_type_ids:
+            seen_type_ids.add(type_id)
+            cursor.execute("INSERT INTO event_types (type_id, name) VALUES (%s, %s) ON CONFLICT (type_id) DO NOTHING;", (type_id, type_name))
 
         player_info = event.get('player')
         if player_info:
             player_id = player_info.get('id')
             player_name = player_info.get('name')
+        else:
+            player_id = None  #  no player is involved in the event
+
+        if player_id is not None and player_id not in seen_player_ids:
+            seen_player_ids.add(player_id)
             cursor.execute("""
                 INSERT INTO players (player_id, name)
                 VALUES (%s, %s)
                 ON CONFLICT (player_id) DO NOTHING;
             """, (player_id, player_name))
-        else:
-            player_id = None  #  no player is involved in the event
 
         # Extract event details
         event_type_key = type_name.lower().replace(" ", "_") 
         event_details = event.get(event_type_key) 
-        event_details_json = json.dumps(event_details) if event_details else None
+        event_details_json = json_codec.dumps(event_details) if event_details else None
+
+        event_row = (
+            match_id, event['period'], event['timestamp'], event['minute'], event['second'],
+            event['possession'], type_id, player_id, 
+            event.get('team', {}).get('id'), json_codec.dumps(event.get('location')), 
+            json_codec.dumps(event.get('related_events')), event_details_json
+        )
+        content_hash = row_content_hash(event_row)
+
+        # Skip events whose stored content is identical
+        if event['id'] in existing_hashes:
+            if existing_hashes[event['id']] == content_hash:
+                counts['unchanged'] += 1
+                continue
 
-        # Check if event already exists
-        cursor.execute("SELECT EXISTS(SELECT 1 FROM events WHERE event_id = %s)", (event['id'],))
-        event_exists = cursor.fetchone()[0]
-
-        if event_exists:
             # Update existing event
             cursor.execute("""
                 UPDATE events
                 SET match_id = %s, period = %s, timestamp = %s, minute = %s, second = %s, 
                     possession = %s, type_id = %s, player_id = %s, team_id = %s, 
-                    location = %s, related_events = %s, event_details = %s
+                    location = %s, related_events = %s, event_details = %s, content_hash = %s
                 WHERE event_id = %s;
-            """, (
-                match_id, event['period'], event['timestamp'], event['minute'], event['second'],
-                event['possession'], type_id, player_id, 
-                event.get('team', {}).get('id'), json.dumps(event.get('location')), 
-                json.dumps(event.get('related_events')), event_details_json, event['id']
-            ))
+            """, event_row + (content_hash, event['id']))
+            counts['updated'] += 1
+            updated_event_ids.append(event['id'])
         else:
             # Insert new event
             cursor.execute("""
-                INSERT INTO events (event_id, match_id, period, timestamp, minute, second, possession, type_id, player_id, team_id, location, related_events, event_details)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-            """, (
-                event['id'], match_id, event['period'], event['timestamp'], event['minute'], event['second'],
-                event['possession'], type_id, player_id, 
-                event.get('team', {}).get('id'), json.dumps(event.get('location')), 
-                json.dumps(event.get('related_events')), event_details_json
-            ))
+                INSERT INTO events (event_id, match_id, period, timestamp, minute, second, possession, type_id, player_id, team_id, location, related_events, event_details, content_hash)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+            """, (event['id'],) + event_row + (content_hash,))
+            counts['inserted'] += 1
+        changed_events.append(event)
+
+    # Updated events get their edges and fact rows rebuilt from scratch
+    delete_event_relations(updated_event_ids, cursor)
+    delete_fact_rows(updated_event_ids, cursor)
+
+    # Store related events as indexed edges so links can be joined without parsing JSON
+    load_event_relations(event_relation_rows(changed_events), cursor)
 
+    # Copy typed fields of shots, passes and dribbles into their fact tables
+    load_fact_rows(match_id, changed_events, cursor)
+
+    return counts
 
 
 # get ids & json data for lineups
-def load_all_lineups_data(db_params):
+# (create_schema=False leaves the schema alone, e.g. while bulk_load.py has its indexes dropped)
+def load_all_lineups_data(db_params, data_dir='data', create_schema=True):
     # Connect to the database
-    conn = psycopg2.connect(**db_params)
+    conn = connect(db_params)
     cursor = conn.cursor()
+    if create_schema:
+        create_lineup_spells_table(cursor)
+        ensure_content_hash_columns(cursor)
+    counts = Counter()
 
     # Get match_ids from matches table
     cursor.execute("SELECT match_id FROM matches;")
     match_ids = cursor.fetchall()
 
+    # Substitutions and match ends from the events, for every match in one query
+    spell_ends = load_spell_ends(cursor, [match_id[0] for match_id in match_ids])
+
     # Iterate over match_ids and load lineup data
     for match_id in match_ids:
-        file_path = f'data/lineups/{match_id[0]}.json'
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as file:
-                lineup_data = json.load(file)
-            load_lineups_data(match_id, lineup_data, cursor)
+        file_path = raw_store.find_data_file(f'{data_dir}/lineups/{match_id[0]}')
+        if file_path:
+            lineup_data = json_codec.load_path(file_path)
+            with pipelined(cursor):
+                counts.update(load_lineups_data(match_id[0], lineup_data, cursor, spell_ends))
 
     # Commit changes and close the connection
-    conn.commit()
+    commit_and_notify(conn)
     cursor.close()
     conn.close()
-
-# Insert data into lineups and related tables
-def load_lineups_data(match_id, lineup_data, cursor):
+    print_change_counts('lineups', counts)
+    return counts
+
+# Insert data into lineups and related tables (spell_ends from load_spell_ends,
+# fetched for this match alone when not given)
+def load_lineups_data(match_id, lineup_data, cursor, spell_ends=None):
+    counts = Counter()
+    lineup_rows = []
+    spell_rows_all = []
     for team in lineup_data:
         team_id = team['team_id']
         # Ensure team is in teams table
@@ -314,15 +450,8 @@ def load_lineups_data(match_id, lineup_data, cursor):
                            VALUES (%s, %s, %s, %s, %s) ON CONFLICT (player_id) DO NOTHING;""", 
                            (player_id, player['player_name'], nickname, country_id, jersey_number))
 
-            # Insert or update lineup entry
-            cursor.execute("""
-                INSERT INTO lineups (match_id, team_id, player_id, jersey_number, position_id)
-                VALUES (%s, %s, %s, %s, NULL)
-                ON CONFLICT (match_id, team_id, player_id) 
-                DO UPDATE SET jersey_number = EXCLUDED.jersey_number;
-            """, (match_id, team_id, player_id, jersey_number))
-
             # Handling positions
+            position_details = (None, None, None, None, None, None, None)
             for position in player.get('positions', []):
                 position_id = position['position_id']
                 # Ensure position is in positions table
@@ -331,15 +460,14 @@ def load_lineups_data(match_id, lineup_data, cursor):
                     VALUES (%s, %s) ON CONFLICT (position_id) DO NOTHING;
                 """, (position_id, position['position']))
 
-                # Update the lineup entry with position details
-                cursor.execute("""
-                    UPDATE lineups
-                    SET position_id = %s, position_from = %s, position_to = %s, from_period = %s, to_period = %s,
-                        start_reason = %s, end_reason = %s
-                    WHERE match_id = %s AND team_id = %s AND player_id = %s;
-                """, (position_id, position['from'], position['to'], position['from_period'], 
-                      position['to_period'], position['start_reason'], position['end_reason'],
-                      match_id, team_id, player_id))
+                # The lineup entry keeps the details of the last position spell
+                position_details = (position_id, position['from'], position['to'], position['from_period'], 
+                                    position['to_period'], position['start_reason'], position['end_reason'])
+
+            lineup_rows.append((match_id, team_id, player_id, jersey_number) + position_details)
+
+            # Every position spell, as an on-pitch interval
+            spell_rows_all.extend(spell_rows(match_id, team_id, player))
 
             # Handling card events
             for card in player.get('cards', []):
@@ -355,6 +483,31 @@ def load_lineups_data(match_id, lineup_data, cursor):
                     ON CONFLICT DO NOTHING;
                 """, (match_id, team_id, player_id, card_type, card_time, card_reason))
 
+    # Insert the lineup entries, updating only those whose content hash changed
+    run_counted_upserts(cursor, """
+        INSERT INTO lineups (match_id, team_id, player_id, jersey_number, position_id, position_from, position_to,
+                             from_period, to_period, start_reason, end_reason, content_hash)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (match_id, team_id, player_id) DO UPDATE SET
+            jersey_number = EXCLUDED.jersey_number,
+            position_id = EXCLUDED.position_id,
+            position_from = EXCLUDED.position_from,
+            position_to = EXCLUDED.position_to,
+            from_period = EXCLUDED.from_period,
+            to_period = EXCLUDED.to_period,
+            start_reason = EXCLUDED.start_reason,
+            end_reason = EXCLUDED.end_reason,
+            content_hash = EXCLUDED.content_hash
+        WHERE lineups.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING (xmax = 0);
+    """, [lineup_row + (row_content_hash(lineup_row),) for lineup_row in lineup_rows], counts)
+
+    # Close the spells the lineup file leaves open from the match's events
+    if spell_ends is None:
+        spell_ends = load_spell_ends(cursor, [match_id])
+    load_lineup_spells(match_id, close_open_spells(spell_rows_all, spell_ends), cursor)
+
+    return counts
 
 
 # Fill in details
@@ -365,8 +518,12 @@ db_parameters = {
     'host': 'localhost'
 }
 
-# USAGE
-load_competitions_to_db('data/competitions.json', db_parameters)
-load_all_match_data(db_parameters)
-load_all_events_data(db_parameters)
-load_all_lineups_data(db_parameters)
\ No newline at end of file
+# USAGE (optionally pass another data directory, e.g. one produced by scale_data.py
+# or raw_store.py; files may be plain .json, .json.gz or .json.zst)
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    competitions_path = raw_store.find_data_file(f'{data_dir}/competitions') or f'{data_dir}/competitions.json'
+    load_competitions_to_db(competitions_path, db_parameters)
+    load_all_match_data(db_parameters, data_dir)
+    load_all_events_data(db_parameters, data_dir)
+    load_all_lineups_data(db_parameters, data_dir)
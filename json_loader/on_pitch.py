@@ -0,0 +1,174 @@
+# On-pitch intervals: every position spell of a lineup (lineups keeps only the
+# last one) stored as a range of match time, with a GiST index on
+# (match_id, on_pitch), so "who was on the pitch when this event happened" is
+# an index probe per event instead of a scan over the match's lineups.
+#
+# Match time is encoded as period * 10000 + clock seconds, where the clock is
+# the MM:SS match clock used by both the lineup spells (from / to) and events
+# (minute / second). The clock does not restart in the second half but it
+# does overlap (first-half stoppage time runs past 45:00), which the period
+# term keeps apart. Ranges are [from, to): a player subbed off at 62:13 is
+# not on the pitch for an event at 62:13, the player coming on is.
+#
+# The lineup files leave a spell's end open (to is null) when the player is
+# on the pitch at the final whistle, but also for some returns after a
+# temporary 'Player Off' even when the player is substituted later (match
+# 3749153, player 40255: back on at 45:28 of the first half, replaced at half
+# time). Open spells are closed from the match's events: at the player's own
+# substitution after the spell started, otherwise one second after the last
+# event of the match. A spell stays open only if the events are not loaded.
+LINEUP_SPELLS_DDL = ["""
+    CREATE EXTENSION IF NOT EXISTS btree_gist;
+""", """
+    CREATE TABLE IF NOT EXISTS lineup_spells (
+        match_id INTEGER NOT NULL,
+        player_id INTEGER NOT NULL,
+        spell INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        position_id INTEGER,
+        on_pitch INT4RANGE NOT NULL,
+        start_reason TEXT,
+        end_reason TEXT,
+        PRIMARY KEY (match_id, player_id, spell)
+    );
+""", """
+    CREATE INDEX IF NOT EXISTS lineup_spells_match_id_on_pitch_idx
+        ON lineup_spells USING gist (match_id, on_pitch);
+"""]
+
+period_span = 10000
+
+# The match time key of an event row aliased e
+EVENT_TIME_SQL = f"(e.period * {period_span} + e.minute * 60 + e.second)"
+
+# Substitution times by player, and one second after the last event, of each
+# of a list of matches
+SPELL_ENDS_QUERY = f"""
+    SELECT e.match_id, e.player_id, {EVENT_TIME_SQL}
+    FROM events e
+    WHERE e.match_id = ANY(%(match_ids)s) AND e.player_id IS NOT NULL
+      AND e.type_id = (SELECT type_id FROM event_types WHERE name = 'Substitution')
+    UNION ALL
+    SELECT e.match_id, NULL, MAX({EVENT_TIME_SQL}) + 1
+    FROM events e
+    WHERE e.match_id = ANY(%(match_ids)s)
+    GROUP BY e.match_id;
+"""
+
+# Players on the pitch at one moment of a match
+PLAYERS_ON_PITCH_QUERY = """
+    SELECT ls.team_id, ls.player_id, p.name, ls.position_id
+    FROM lineup_spells ls
+    JOIN players p ON p.player_id = ls.player_id
+    WHERE ls.match_id = %(match_id)s AND ls.on_pitch @> %(match_time)s::integer
+    ORDER BY ls.team_id, ls.position_id;
+"""
+
+# On-pitch xG for and against every player over a season: each shot is joined
+# to the players of both teams on the pitch when it was taken. type_id is the
+# Shot event type (query_catalog.event_type_id('Shot'))
+ON_PITCH_XG_QUERY = f"""
+    SELECT ls.player_id, p.name AS player_name, COUNT(*) AS shots_on_pitch,
+           SUM(CASE WHEN e.team_id = ls.team_id THEN (e.event_details->>'statsbomb_xg')::float ELSE 0 END) AS xg_for,
+           SUM(CASE WHEN e.team_id <> ls.team_id THEN (e.event_details->>'statsbomb_xg')::float ELSE 0 END) AS xg_against
+    FROM events e
+    JOIN matches m ON e.match_id = m.match_id
+    JOIN lineup_spells ls ON ls.match_id = e.match_id AND ls.on_pitch @> {EVENT_TIME_SQL}
+    JOIN players p ON p.player_id = ls.player_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+    GROUP BY ls.player_id, p.name
+    ORDER BY xg_for - xg_against DESC;
+"""
+
+def create_lineup_spells_table(cursor):
+    for statement in LINEUP_SPELLS_DDL:
+        cursor.execute(statement)
+
+# 'MM:SS' match clock -> seconds
+def clock_seconds(clock):
+    minutes, seconds = clock.split(':')
+    return int(minutes) * 60 + int(seconds)
+
+def match_time(period, clock_secs):
+    return period * period_span + clock_secs
+
+# [lower, upper) of a position spell; upper is None when the lineup leaves it open
+def spell_bounds(position):
+    lower = match_time(position['from_period'], clock_seconds(position['from']))
+    if position.get('to') is None:
+        return lower, None
+    return lower, match_time(position['to_period'], clock_seconds(position['to']))
+
+# (match_id, player_id, spell, team_id, position_id, lower, upper, start_reason, end_reason)
+# for every position spell of one player
+def spell_rows(match_id, team_id, player):
+    rows = []
+    for spell, position in enumerate(player.get('positions', [])):
+        lower, upper = spell_bounds(position)
+        rows.append((match_id, player['player_id'], spell, team_id, position['position_id'], lower, upper,
+                     position.get('start_reason'), position.get('end_reason')))
+    return rows
+
+# (substitution times by (match_id, player_id), end of each match) for
+# close_open_spells
+def load_spell_ends(cursor, match_ids):
+    cursor.execute(SPELL_ENDS_QUERY, {'match_ids': list(match_ids)})
+    substitutions = {}
+    match_ends = {}
+    for match_id, player_id, event_time in cursor.fetchall():
+        if player_id is None:
+            match_ends[match_id] = event_time
+        else:
+            substitutions.setdefault((match_id, player_id), []).append(event_time)
+    return substitutions, match_ends
+
+# Close the open spells of spell_rows at the player's next substitution, or
+# else at the end of the match (see the top of this file)
+def close_open_spells(rows, spell_ends):
+    substitutions, match_ends = spell_ends
+    closed = []
+    for row in rows:
+        match_id, player_id, lower, upper = row[0], row[1], row[5], row[6]
+        if upper is None:
+            later = [event_time for event_time in substitutions.get((match_id, player_id), []) if event_time > lower]
+            upper = min(later) if later else match_ends.get(match_id)
+            if upper is not None and upper > lower:
+                row = row[:6] + (upper,) + row[7:]
+        closed.append(row)
+    return closed
+
+# Write a match's spells, rewriting only changed ones and removing spells that
+# are no longer in the lineup file
+def load_lineup_spells(match_id, rows, cursor):
+    if rows:
+        cursor.executemany("""
+            INSERT INTO lineup_spells (match_id, player_id, spell, team_id, position_id, on_pitch, start_reason, end_reason)
+            VALUES (%s, %s, %s, %s, %s, int4range(%s::integer, %s::integer, '[)'), %s, %s)
+            ON CONFLICT (match_id, player_id, spell) DO UPDATE SET
+                team_id = EXCLUDED.team_id,
+                position_id = EXCLUDED.position_id,
+                on_pitch = EXCLUDED.on_pitch,
+                start_reason = EXCLUDED.start_reason,
+                end_reason = EXCLUDED.end_reason
+            WHERE (lineup_spells.team_id, lineup_spells.position_id, lineup_spells.on_pitch,
+                   lineup_spells.start_reason, lineup_spells.end_reason)
+                IS DISTINCT FROM (EXCLUDED.team_id, EXCLUDED.position_id, EXCLUDED.on_pitch,
+                                  EXCLUDED.start_reason, EXCLUDED.end_reason);
+        """, rows)
+    cursor.execute("""
+        DELETE FROM lineup_spells
+        WHERE match_id = %s
+          AND (player_id, spell) NOT IN (SELECT * FROM unnest(%s::integer[], %s::integer[]));
+    """, (match_id, [row[1] for row in rows], [row[2] for row in rows]))
+
+def players_on_pitch(cursor, match_id, period, minute, second=0):
+    cursor.execute(PLAYERS_ON_PITCH_QUERY, {'match_id': match_id, 'match_time': match_time(period, minute * 60 + second)})
+    return cursor.fetchall()
+
+# Season-wide on-pitch xG for and against by player; shot_type_id from
+# query_catalog.event_type_id('Shot')
+def on_pitch_xg(cursor, competition_id, season_id, shot_type_id):
+    cursor.execute(ON_PITCH_XG_QUERY, {'competition_id': competition_id, 'season_id': season_id,
+                                       'type_id': shot_type_id})
+    return cursor.fetchall()
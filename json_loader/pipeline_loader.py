@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+from collections import Counter
+import json_codec
+import raw_store
+from db import connect, pipelined, commit_and_notify
+from json_loader_source import (load_events_data, load_lineups_data, ensure_content_hash_columns,
+                                print_change_counts, db_parameters)
+from event_links import create_event_relations_table
+from fact_tables import create_fact_tables
+from timeline import create_timeline_index
+from on_pitch import create_lineup_spells_table, load_spell_ends
+
+# Pipelined loader: file reads, JSON parsing and database writes run as
+# separate stages connected by bounded queues. A full queue blocks the stage
+# feeding it, so at most queue_size raw files and queue_size parsed files are
+# held in memory at any time no matter how far the reader gets ahead. Raw
+# files are queued as read (compressed, if stored compressed) and only
+# decompressed, in full, by the parse stage.
+
+_DONE = object()
+
+# Time accounting for one stage. busy is time spent doing the stage's own
+# work, starved is time blocked waiting for input, blocked is time spent
+# waiting for room in the downstream queue (backpressure).
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.max_queue_depth = 0
+
+    def utilization(self, wall_time):
+        return self.busy / wall_time if wall_time else 0.0
+
+def _put(out_q, item, stats, stop):
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            out_q.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            continue
+    stats.blocked += time.perf_counter() - start
+    stats.max_queue_depth = max(stats.max_queue_depth, out_q.qsize())
+
+def _get(in_q, stats, stop):
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            item = in_q.get(timeout=0.1)
+            break
+        except queue.Empty:
+            continue
+    else:
+        item = _DONE
+    stats.starved += time.perf_counter() - start
+    return item
+
+# Stage 1: read raw file bytes (still compressed for .json.gz / .json.zst)
+def _read_stage(jobs, out_q, stats, stop):
+    for match_id, file_path in jobs:
+        if stop.is_set():
+            break
+        start = time.perf_counter()
+        with open(file_path, 'rb') as file:
+            raw = file.read()
+        stats.busy += time.perf_counter() - start
+        stats.items += 1
+        _put(out_q, (match_id, file_path, raw), stats, stop)
+    _put(out_q, _DONE, stats, stop)
+
+# Stage 2: decompress and decode JSON
+def _parse_stage(in_q, out_q, stats, stop):
+    while True:
+        item = _get(in_q, stats, stop)
+        if item is _DONE:
+            break
+        match_id, file_path, raw = item
+        start = time.perf_counter()
+        data = json_codec.loads(raw_store.decompress(raw, file_path))
+        stats.busy += time.perf_counter() - start
+        stats.items += 1
+        _put(out_q, (match_id, data), stats, stop)
+    _put(out_q, _DONE, stats, stop)
+
+# Stage 3: build rows and write them to the database
+def _write_stage(in_q, cursor, load_fn, stats, counts, stop):
+    while True:
+        item = _get(in_q, stats, stop)
+        if item is _DONE:
+            break
+        match_id, data = item
+        start = time.perf_counter()
+        with pipelined(cursor):
+            counts.update(load_fn(match_id, data, cursor))
+        stats.busy += time.perf_counter() - start
+        stats.items += 1
+
+def _run_stage(target, args, errors, stop):
+    try:
+        target(*args)
+    except Exception as error:
+        errors.append(error)
+        stop.set()
+
+# Run the three stages over (match_id, file_path) jobs, writing with load_fn
+def run_pipeline(jobs, load_fn, cursor, queue_size=4):
+    raw_q = queue.Queue(maxsize=queue_size)
+    parsed_q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    stats = [StageStats('read'), StageStats('parse'), StageStats('write')]
+    counts = Counter()
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=_run_stage, args=(_read_stage, (jobs, raw_q, stats[0], stop), errors, stop)),
+        threading.Thread(target=_run_stage, args=(_parse_stage, (raw_q, parsed_q, stats[1], stop), errors, stop)),
+    ]
+    for thread in threads:
+        thread.start()
+    # The writer runs on the calling thread so the cursor never changes threads
+    _run_stage(_write_stage, (parsed_q, cursor, load_fn, stats[2], counts, stop), errors, stop)
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+    return stats, wall_time, counts
+
+def print_stage_report(stats, wall_time):
+    print(f"Pipeline wall time: {wall_time:.2f} s")
+    print(f"{'stage':<8}{'items':>8}{'busy s':>10}{'starved s':>11}{'blocked s':>11}{'util':>8}{'max q':>7}")
+    for stage in stats:
+        print(f"{stage.name:<8}{stage.items:>8}{stage.busy:>10.2f}{stage.starved:>11.2f}"
+              f"{stage.blocked:>11.2f}{stage.utilization(wall_time):>8.0%}{stage.max_queue_depth:>7}")
+    bottleneck = max(stats, key=lambda stage: stage.busy)
+    print(f"Bottleneck stage: {bottleneck.name}")
+
+def _match_jobs(cursor, data_dir, directory):
+    cursor.execute("SELECT match_id FROM matches;")
+    jobs = []
+    for (match_id,) in cursor.fetchall():
+        file_path = raw_store.find_data_file(f'{data_dir}/{directory}/{match_id}')
+        if file_path:
+            jobs.append((match_id, file_path))
+    return jobs
+
+# Pipelined equivalent of load_all_events_data
+def pipelined_load_all_events_data(db_params, queue_size=4, data_dir='data'):
+    conn = connect(db_params)
+    cursor = conn.cursor()
+    create_event_relations_table(cursor)
+    create_fact_tables(cursor)
+    create_timeline_index(cursor)
+    ensure_content_hash_columns(cursor)
+
+    stats, wall_time, counts = run_pipeline(_match_jobs(cursor, data_dir, 'events'), load_events_data, cursor, queue_size)
+
+    commit_and_notify(conn)
+    cursor.close()
+    conn.close()
+    print_stage_report(stats, wall_time)
+    print_change_counts('events', counts)
+    return stats
+
+# Pipelined equivalent of load_all_lineups_data
+def pipelined_load_all_lineups_data(db_params, queue_size=4, data_dir='data'):
+    conn = connect(db_params)
+    cursor = conn.cursor()
+    create_lineup_spells_table(cursor)
+    ensure_content_hash_columns(cursor)
+
+    jobs = _match_jobs(cursor, data_dir, 'lineups')
+    spell_ends = load_spell_ends(cursor, [match_id for match_id, _ in jobs])
+    load_fn = lambda match_id, lineup_data, cursor: load_lineups_data(match_id, lineup_data, cursor, spell_ends)
+    stats, wall_time, counts = run_pipeline(jobs, load_fn, cursor, queue_size)
+
+    commit_and_notify(conn)
+    cursor.close()
+    conn.close()
+    print_stage_report(stats, wall_time)
+    print_change_counts('lineups', counts)
+    return stats
+
+# USAGE (after competitions and matches are loaded)
+if __name__ == "__main__":
+    pipelined_load_all_events_data(db_parameters)
+    pipelined_load_all_lineups_data(db_parameters)
@@ -0,0 +1,88 @@
+import gzip
+import os
+import shutil
+import sys
+
+# Raw data store: data files may be stored as plain .json, gzip (.json.gz) or
+# zstd (.json.zst, when the optional zstandard package is installed). Readers
+# pass the path without its .json suffix and get back whichever file exists;
+# compressed files are decompressed in memory, never to disk. The JSON
+# decoders take a whole document, so reading a file still holds its full
+# decompressed text while it is parsed; compression saves disk space and
+# read I/O, not memory.
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {None: '.json', 'gzip': '.json.gz', 'zstd': '.json.zst'}
+
+# Suffixes tried, in order, when looking up a data file
+SEARCH_SUFFIXES = ['.json', '.json.zst', '.json.gz']
+
+def data_file_path(base_path, compression=None):
+    return base_path + COMPRESSION_SUFFIXES[compression]
+
+# Existing data file for base_path (e.g. 'data/events/15946'), or None
+def find_data_file(base_path):
+    for suffix in SEARCH_SUFFIXES:
+        if os.path.exists(base_path + suffix):
+            return base_path + suffix
+    return None
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("zstd data files need the zstandard package (pip install zstandard)")
+
+# Binary file object that yields the decompressed JSON
+def open_data_file(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+def read_data_file(path):
+    with open_data_file(path) as file:
+        return file.read()
+
+# Decompress bytes read as-is from path (used when reading and decompressing
+# happen in different stages, as in pipeline_loader.py)
+def decompress(data, path):
+    if path.endswith('.gz'):
+        return gzip.decompress(data)
+    if path.endswith('.zst'):
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+# Binary file object that compresses what is written to it
+def open_for_write(path, compression=None):
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == 'zstd':
+        _require_zstandard()
+        return zstandard.ZstdCompressor(level=10).stream_writer(open(path, 'wb'), closefd=True)
+    return open(path, 'wb')
+
+# Copy a plain data tree (competitions.json, matches/, events/, lineups/) into
+# target_dir, compressing every .json file
+def compress_tree(source_dir, target_dir, compression):
+    for root, _, files in os.walk(source_dir):
+        for filename in files:
+            if not filename.endswith('.json'):
+                continue
+            source_path = os.path.join(root, filename)
+            base_path = os.path.join(target_dir, os.path.relpath(source_path, source_dir))[:-len('.json')]
+            os.makedirs(os.path.dirname(base_path), exist_ok=True)
+            with open(source_path, 'rb') as source, open_for_write(data_file_path(base_path, compression), compression) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+
+# USAGE (from json_loader/):  python raw_store.py gzip data data_gz
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] not in ('gzip', 'zstd'):
+        print("Usage: python raw_store.py gzip|zstd <source_dir> <target_dir>")
+        sys.exit(1)
+    compress_tree(sys.argv[2], sys.argv[3], sys.argv[1])
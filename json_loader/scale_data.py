@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+import uuid
+import json_codec
+import raw_store
+
+# Synthetic dataset scaler: writes an N-times-larger copy of the data/ tree
+# for load and query scaling tests. Copy 0 is the original data; every
+# further copy k repeats each season under a new season_id with new match
+# ids and event UUIDs, so every id stays unique while the schema and the
+# per-match event type mix are exactly those of the real data. Competition
+# and season names are kept, so queries that filter by name (e.g. La Liga
+# 2020/2021) see N times as many matches, while queries filtering on the
+# original ids keep returning the original rows.
+#
+# Usage (from json_loader/):  python scale_data.py 10 data_x10
+# then load it with:          python json_loader_source.py data_x10
+
+# Offsets added per copy; chosen so ids stay within a 32-bit integer up to 100x
+season_id_step = 1000
+match_id_step = 10_000_000
+
+# Namespace for deterministic event UUIDs, so reruns produce identical files
+event_namespace = uuid.UUID('6f1d3c1e-5a0b-4d43-9a53-1f7c2c1f9b10')
+
+# Specified seasons (the same filter as load_competitions_to_db)
+def is_specified_season(competition):
+    return ((competition['competition_name'] == 'La Liga' and competition['season_name'] in ['2020/2021', '2019/2020', '2018/2019'])
+            or (competition['competition_name'] == 'Premier League' and competition['season_name'] == '2003/2004'))
+
+def scaled_season_id(season_id, copy):
+    return season_id + copy * season_id_step
+
+def scaled_match_id(match_id, copy):
+    return match_id + copy * match_id_step
+
+def scaled_event_id(event_id, copy):
+    if copy == 0:
+        return event_id
+    return str(uuid.uuid5(event_namespace, f'{copy}:{event_id}'))
+
+def read_json(file_path):
+    return json_codec.load_path(file_path)
+
+# Written in the same indented layout as the StatsBomb files so file sizes
+# (and therefore read and parse costs) scale like the real data
+def write_json(data, file_path):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2, separators=(',', ' : '), ensure_ascii=False)
+
+def scale_competitions(competitions, factor):
+    scaled = list(competitions)
+    for copy in range(1, factor):
+        for competition in competitions:
+            if is_specified_season(competition):
+                scaled.append(dict(competition, season_id=scaled_season_id(competition['season_id'], copy)))
+    return scaled
+
+def scale_match(match, copy):
+    match = dict(match)
+    match['match_id'] = scaled_match_id(match['match_id'], copy)
+    match['season'] = dict(match['season'], season_id=scaled_season_id(match['season']['season_id'], copy))
+    return match
+
+def is_uuid(value):
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+# Remap every event UUID held in a "*_id" key of the detail objects (e.g.
+# shot.key_pass_id, pass.assisted_shot_id), so links stay within the copy
+def scale_event_links(value, copy):
+    if isinstance(value, dict):
+        return {key: scaled_event_id(item, copy) if key.endswith('_id') and isinstance(item, str) and is_uuid(item)
+                else scale_event_links(item, copy)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [scale_event_links(item, copy) for item in value]
+    return value
+
+def scale_events(events_data, copy):
+    if copy == 0:
+        return events_data
+    scaled = []
+    for event in events_data:
+        event = scale_event_links(event, copy)
+        event['id'] = scaled_event_id(event['id'], copy)
+        if 'related_events' in event:
+            event['related_events'] = [scaled_event_id(related_id, copy) for related_id in event['related_events']]
+        scaled.append(event)
+    return scaled
+
+def scale_dataset(source_dir, target_dir, factor):
+    competitions = read_json(raw_store.find_data_file(f'{source_dir}/competitions') or f'{source_dir}/competitions.json')
+    write_json(scale_competitions(competitions, factor), f'{target_dir}/competitions.json')
+
+    file_count = 0
+    for competition in competitions:
+        if not is_specified_season(competition):
+            continue
+        competition_id = competition['competition_id']
+        season_id = competition['season_id']
+        matches_path = raw_store.find_data_file(f'{source_dir}/matches/{competition_id}/{season_id}')
+        if not matches_path:
+            print(f"File not found: {source_dir}/matches/{competition_id}/{season_id}.json")
+            continue
+        matches_data = read_json(matches_path)
+
+        for copy in range(factor):
+            write_json([scale_match(match, copy) for match in matches_data],
+                       f'{target_dir}/matches/{competition_id}/{scaled_season_id(season_id, copy)}.json')
+
+        # Events and lineups are read once per match and written once per copy
+        for match in matches_data:
+            match_id = match['match_id']
+            events_path = raw_store.find_data_file(f'{source_dir}/events/{match_id}')
+            lineups_path = raw_store.find_data_file(f'{source_dir}/lineups/{match_id}')
+            events_data = read_json(events_path) if events_path else None
+            lineup_data = read_json(lineups_path) if lineups_path else None
+
+            for copy in range(factor):
+                new_match_id = scaled_match_id(match_id, copy)
+                if events_data is not None:
+                    write_json(scale_events(events_data, copy), f'{target_dir}/events/{new_match_id}.json')
+                    file_count += 1
+                if lineup_data is not None:
+                    write_json(lineup_data, f'{target_dir}/lineups/{new_match_id}.json')
+                    file_count += 1
+
+        print(f"Scaled {competition['competition_name']} {competition['season_name']} x{factor}")
+
+    print(f"Wrote {file_count} event and lineup files to {target_dir}")
+
+# USAGE
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python scale_data.py <factor> [target_dir]")
+        sys.exit(1)
+    scale_factor = int(sys.argv[1])
+    target_directory = sys.argv[2] if len(sys.argv) > 2 else f'data_x{scale_factor}'
+    scale_dataset('data', target_directory, scale_factor)
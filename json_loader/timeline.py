@@ -0,0 +1,88 @@
+# Ordered match timeline: a match's events in the order they happened, read
+# in pages with keyset pagination (each page continues after the last row of
+# the previous one instead of using OFFSET), so a page late in a match costs
+# the same as the first one.
+#
+# Timeline order is (period, timestamp), with event_id breaking ties between
+# events that share a timestamp. timestamp restarts every period while minute
+# keeps counting (period 2 starts at minute 45), and within a period minute is
+# the elapsed time in whole minutes, so ordering by (period, minute, timestamp)
+# is the same order. Keeping minute in the index key lets a minute range be
+# checked inside the index rather than on every heap row.
+TIMELINE_INDEX_DDL = """
+    CREATE INDEX IF NOT EXISTS events_match_timeline_idx
+        ON events (match_id, period, minute, timestamp, event_id);
+"""
+
+TIMELINE_ORDER = "period, minute, timestamp, event_id"
+
+# One page of a match's events; the keyset condition is added when continuing
+TIMELINE_PAGE_QUERY = """
+    SELECT e.event_id, e.period, e.timestamp, e.minute, e.second, e.possession, et.name AS type_name,
+           e.player_id, e.team_id, e.location, e.related_events, e.event_details
+    FROM (
+        SELECT *
+        FROM events
+        WHERE match_id = %(match_id)s
+          AND minute BETWEEN %(minute_from)s AND %(minute_to)s
+          {after}
+        ORDER BY {order}
+        LIMIT %(page_size)s
+    ) e
+    JOIN event_types et ON e.type_id = et.type_id
+    ORDER BY {order};
+"""
+
+TIMELINE_AFTER = "AND (period, minute, timestamp, event_id) > (%(period)s, %(minute)s, %(timestamp)s, %(event_id)s)"
+
+default_page_size = 500
+
+# Minute bounds used when no range is given (extra time ends at 120 plus stoppage)
+min_minute = 0
+max_minute = 1000
+
+def create_timeline_index(cursor):
+    cursor.execute(TIMELINE_INDEX_DDL)
+
+def timeline_query(after=None):
+    return TIMELINE_PAGE_QUERY.format(after=TIMELINE_AFTER if after else '', order=TIMELINE_ORDER)
+
+# Keyset of a timeline row: where the next page starts
+def timeline_key(row):
+    event_id, period, timestamp, minute = row[0], row[1], row[2], row[3]
+    return (period, minute, timestamp, event_id)
+
+# Keys as opaque cursor strings (e.g. for an HTTP API) and back
+def encode_cursor(key):
+    return ','.join(str(value) for value in key)
+
+def decode_cursor(text):
+    period, minute, timestamp, event_id = text.split(',')
+    return (int(period), int(minute), timestamp, event_id)
+
+# One page of events of match_id after the given key (None for the first page),
+# optionally only events from minute_from to minute_to inclusive.
+# Returns (rows, key of the next page or None at the end of the timeline).
+def read_timeline_page(cursor, match_id, after=None, minute_from=None, minute_to=None,
+                       page_size=default_page_size):
+    params = {
+        'match_id': match_id,
+        'minute_from': min_minute if minute_from is None else minute_from,
+        'minute_to': max_minute if minute_to is None else minute_to,
+        'page_size': page_size,
+    }
+    if after:
+        params.update(zip(('period', 'minute', 'timestamp', 'event_id'), after))
+    cursor.execute(timeline_query(after), params)
+    rows = cursor.fetchall()
+    next_key = timeline_key(rows[-1]) if len(rows) == page_size else None
+    return rows, next_key
+
+# Every event of a match (within the minute range) in timeline order, page by page
+def stream_timeline(cursor, match_id, minute_from=None, minute_to=None, page_size=default_page_size):
+    key = None
+    while True:
+        rows, key = read_timeline_page(cursor, match_id, key, minute_from, minute_to, page_size)
+        yield from rows
+        if key is None:
+            break
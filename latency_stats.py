@@ -0,0 +1,14 @@
+'''
+latency_stats.py
+=========================================================
+Latency summaries shared by the load generator (load_generator.py) and the
+leaderboard service (stats_service.py).
+=========================================================
+'''
+
+# Nearest-rank percentile of an ascending list; 0.0 for an empty list
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
@@ -0,0 +1,157 @@
+'''
+load_generator.py
+=========================================================
+Concurrent load generator for the Q_1 to Q_10 workload (query_catalog.py),
+simulating many dashboard users against one Postgres configuration.
+
+Closed loop: --users virtual users each run a query, wait --think-time
+seconds and run the next one, so load adapts to how fast the server answers.
+Open loop: queries arrive as a Poisson process at --rate per second whether
+or not earlier ones have finished, so queueing shows up as latency.
+
+All queries go through a fixed-size async connection pool (--pool-size) and
+run as prepared statements on each pooled connection.
+Latency is measured from when a query is issued (or arrives, in open loop)
+until its rows are fetched, so time spent waiting for a pooled connection
+is included.
+
+Usage:
+    python load_generator.py --mode closed --users 32 --duration 60
+    python load_generator.py --mode open --rate 50 --duration 60 --seasons 11:90,2:44
+=========================================================
+'''
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from psycopg_pool import AsyncConnectionPool
+from latency_stats import percentile
+from query_catalog import CATALOG, EVENT_TYPES_QUERY, cache_event_type_ids, query_names, query_params
+
+# Connection Information
+query_database_name = "query_database"
+db_username = 'postgres'
+db_password = '1234'
+db_host = 'localhost'
+db_port = '5432'
+
+default_seasons = [(11, 90), (11, 42), (11, 4), (2, 44)]
+
+class QueryStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+async def run_query(pool, name, params, stats, issued_at):
+    try:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(CATALOG[name]['sql'], params, prepare=True)
+                await cursor.fetchall()
+        stats[name].latencies.append(time.perf_counter() - issued_at)
+    except Exception as error:
+        stats[name].errors += 1
+        print(f"[ERROR] {name} {params}: {error}")
+
+def pick_query(rng, names, seasons):
+    name = rng.choice(names)
+    competition_id, season_id = rng.choice(seasons)
+    return name, query_params(name, competition_id, season_id)
+
+async def closed_loop(pool, names, seasons, stats, users, think_time, deadline, seed):
+    async def user(user_id):
+        rng = random.Random(seed + user_id)
+        while time.perf_counter() < deadline:
+            name, params = pick_query(rng, names, seasons)
+            await run_query(pool, name, params, stats, time.perf_counter())
+            if think_time:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+
+    await asyncio.gather(*(user(user_id) for user_id in range(users)))
+
+async def open_loop(pool, names, seasons, stats, rate, deadline, seed):
+    rng = random.Random(seed)
+    tasks = set()
+    next_arrival = time.perf_counter()
+    while next_arrival < deadline:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        name, params = pick_query(rng, names, seasons)
+        task = asyncio.create_task(run_query(pool, name, params, stats, next_arrival))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        next_arrival += rng.expovariate(rate)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+def print_report(stats, elapsed):
+    print(f"{'query':<7}{'ok':>7}{'err':>6}{'err %':>7}{'qps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    all_latencies = []
+    total_errors = 0
+    for name in query_names():
+        if name not in stats:
+            continue
+        latencies = sorted(stats[name].latencies)
+        errors = stats[name].errors
+        all_latencies.extend(latencies)
+        total_errors += errors
+        issued = len(latencies) + errors
+        print(f"{name:<7}{len(latencies):>7}{errors:>6}{(errors / issued if issued else 0):>7.1%}"
+              f"{len(latencies) / elapsed:>8.1f}{percentile(latencies, 0.50) * 1000:>9.1f}"
+              f"{percentile(latencies, 0.95) * 1000:>9.1f}{percentile(latencies, 0.99) * 1000:>9.1f}"
+              f"{(latencies[-1] if latencies else 0) * 1000:>9.1f}")
+    all_latencies.sort()
+    issued = len(all_latencies) + total_errors
+    print(f"{'all':<7}{len(all_latencies):>7}{total_errors:>6}{(total_errors / issued if issued else 0):>7.1%}"
+          f"{len(all_latencies) / elapsed:>8.1f}{percentile(all_latencies, 0.50) * 1000:>9.1f}"
+          f"{percentile(all_latencies, 0.95) * 1000:>9.1f}{percentile(all_latencies, 0.99) * 1000:>9.1f}"
+          f"{(all_latencies[-1] if all_latencies else 0) * 1000:>9.1f}")
+    if all_latencies:
+        print(f"Mean latency {statistics.mean(all_latencies) * 1000:.1f} ms over {elapsed:.1f} s")
+
+async def run_load(args):
+    conninfo = f"dbname={query_database_name} user={db_username} password={db_password} host={db_host} port={db_port}"
+    names = args.queries.split(',') if args.queries else query_names()
+    seasons = ([tuple(int(part) for part in pair.split(':')) for pair in args.seasons.split(',')]
+               if args.seasons else default_seasons)
+    stats = {name: QueryStats() for name in names}
+
+    async with AsyncConnectionPool(conninfo, min_size=args.pool_size, max_size=args.pool_size,
+                                   timeout=args.pool_timeout, open=False) as pool:
+        await pool.wait()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(EVENT_TYPES_QUERY)
+            cache_event_type_ids(await cursor.fetchall())
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+        if args.mode == 'closed':
+            await closed_loop(pool, names, seasons, stats, args.users, args.think_time, deadline, args.seed)
+        else:
+            await open_loop(pool, names, seasons, stats, args.rate, deadline, args.seed)
+        elapsed = time.perf_counter() - start
+
+    print(f"Mode {args.mode}, pool size {args.pool_size}, "
+          + (f"{args.users} users" if args.mode == 'closed' else f"{args.rate}/s arrival rate"))
+    print_report(stats, elapsed)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent Q_n load generator")
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed')
+    parser.add_argument('--users', type=int, default=16, help="closed loop: concurrent virtual users")
+    parser.add_argument('--think-time', type=float, default=0.0, help="closed loop: mean seconds between a user's queries")
+    parser.add_argument('--rate', type=float, default=10.0, help="open loop: mean arrivals per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds to generate load for")
+    parser.add_argument('--pool-size', type=int, default=8)
+    parser.add_argument('--pool-timeout', type=float, default=30.0, help="seconds to wait for a pooled connection")
+    parser.add_argument('--queries', help="comma separated subset, e.g. Q_1,Q_4")
+    parser.add_argument('--seasons', help="comma separated competition_id:season_id pairs")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+''' MAIN '''
+if __name__ == "__main__":
+    asyncio.run(run_load(parse_args()))
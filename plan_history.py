@@ -0,0 +1,173 @@
+'''
+plan_history.py
+=========================================================
+Stores the EXPLAIN (ANALYZE, BUFFERS, SETTINGS, FORMAT JSON) plan of every
+Q_n in a history keyed by run, and compares two runs for time regressions,
+plan shape changes (scan type changes, join order changes) and differences
+in the session settings the plans ran with (session_profiles.py).
+
+Usage:
+    python plan_history.py list
+    python plan_history.py compare <base_run_id> <new_run_id> [threshold]
+
+compare exits with status 1 if it finds any regression, so CI can fail on it.
+=========================================================
+'''
+
+import json
+import os
+import sys
+from datetime import datetime
+
+# Directory Path
+dir_path = os.path.dirname(os.path.realpath(__file__))
+history_path = os.path.join(dir_path, "plan_history")
+
+# A run is slower than its base if it takes this many times as long
+default_threshold = 1.2
+
+# Run ids sort by start time; an optional label (e.g. a branch or schema
+# change name) is appended so runs are easy to tell apart.
+def new_run_id(label=None):
+    run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+    if label:
+        run_id += "-" + "".join(c if c.isalnum() or c in "-_" else "_" for c in label)
+    return run_id
+
+# Run EXPLAIN ANALYZE with buffers and return the plan document (a dict with
+# "Plan", "Planning Time", "Execution Time" and, when any planner setting
+# differs from the server default, "Settings")
+def capture_plan(cursor, sql_query):
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, SETTINGS, FORMAT JSON) {sql_query}")
+    explain_output = cursor.fetchone()[0]
+    if isinstance(explain_output, str):
+        explain_output = json.loads(explain_output)
+    return explain_output[0]
+
+def record_plan(run_id, i, plan):
+    run_path = os.path.join(history_path, run_id)
+    os.makedirs(run_path, exist_ok=True)
+    with open(os.path.join(run_path, f"Q_{i}.json"), 'w', encoding='utf-8') as file:
+        json.dump(plan, file, indent=2)
+
+def load_run(run_id):
+    run_path = os.path.join(history_path, run_id)
+    plans = {}
+    for filename in os.listdir(run_path):
+        if filename.endswith(".json"):
+            with open(os.path.join(run_path, filename), 'r', encoding='utf-8') as file:
+                plans[filename[:-len(".json")]] = json.load(file)
+    return plans
+
+def list_runs():
+    if not os.path.isdir(history_path):
+        return []
+    return sorted(os.listdir(history_path))
+
+# Walk a plan tree depth first
+def _nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _nodes(child)
+
+# Scan type used for each relation (keyed by alias so self-joins stay apart)
+def scan_types(plan):
+    scans = {}
+    for node in _nodes(plan["Plan"]):
+        if "Relation Name" in node:
+            alias = node.get("Alias", node["Relation Name"])
+            scans[alias] = node["Node Type"]
+    return scans
+
+# Order in which relations are reached under join nodes, outer side first
+def join_order(plan):
+    return [node.get("Alias", node["Relation Name"]) for node in _nodes(plan["Plan"]) if "Relation Name" in node]
+
+def node_shape(plan):
+    return [node["Node Type"] for node in _nodes(plan["Plan"])]
+
+def shared_buffers(plan):
+    top = plan["Plan"]
+    return top.get("Shared Hit Blocks", 0) + top.get("Shared Read Blocks", 0)
+
+# Worst ratio between estimated and actual rows over all plan nodes. Both
+# "Plan Rows" and "Actual Rows" are per loop, so nodes on the inner side of a
+# nested loop are compared per execution as well.
+def worst_row_estimate(plan):
+    worst = 1.0
+    for node in _nodes(plan["Plan"]):
+        estimated = max(node.get("Plan Rows", 0), 1)
+        actual = max(node.get("Actual Rows", 0), 1)
+        worst = max(worst, estimated / actual, actual / estimated)
+    return worst
+
+# Compare two plans of the same query; returns a list of findings
+def compare_plans(base, new, threshold=default_threshold):
+    findings = []
+
+    base_time = base["Execution Time"]
+    new_time = new["Execution Time"]
+    if base_time > 0 and new_time / base_time >= threshold:
+        findings.append(f"time regression {base_time:.1f} ms -> {new_time:.1f} ms ({new_time / base_time:.2f}x)")
+
+    base_scans = scan_types(base)
+    new_scans = scan_types(new)
+    for alias in sorted(set(base_scans) | set(new_scans)):
+        if base_scans.get(alias) != new_scans.get(alias):
+            findings.append(f"scan on {alias}: {base_scans.get(alias)} -> {new_scans.get(alias)}")
+
+    base_settings = base.get("Settings", {})
+    new_settings = new.get("Settings", {})
+    if base_settings != new_settings:
+        changed = [f"{name}={base_settings.get(name, 'default')}->{new_settings.get(name, 'default')}"
+                   for name in sorted(set(base_settings) | set(new_settings))
+                   if base_settings.get(name) != new_settings.get(name)]
+        findings.append("settings: " + ", ".join(changed))
+
+    if join_order(base) != join_order(new):
+        findings.append(f"join order: {' > '.join(join_order(base))} -> {' > '.join(join_order(new))}")
+    elif node_shape(base) != node_shape(new):
+        findings.append("plan shape changed: " + " / ".join(node_shape(new)))
+
+    return findings
+
+def compare_runs(base_run_id, new_run_id, threshold=default_threshold):
+    base_plans = load_run(base_run_id)
+    new_plans = load_run(new_run_id)
+
+    print(f"Comparing {base_run_id} -> {new_run_id}")
+    print(f"{'query':<7}{'base ms':>10}{'new ms':>10}{'ratio':>8}{'buffers':>18}{'row est':>9}")
+
+    regressions = 0
+    for name in sorted(set(base_plans) & set(new_plans), key=lambda n: int(n.split("_")[1])):
+        base = base_plans[name]
+        new = new_plans[name]
+        ratio = new["Execution Time"] / base["Execution Time"] if base["Execution Time"] else 0.0
+        buffers = f"{shared_buffers(base)} -> {shared_buffers(new)}"
+        print(f"{name:<7}{base['Execution Time']:>10.1f}{new['Execution Time']:>10.1f}{ratio:>8.2f}"
+              f"{buffers:>18}{worst_row_estimate(new):>8.0f}x")
+        for finding in compare_plans(base, new, threshold):
+            print(f"    ! {finding}")
+            regressions += 1
+
+    for name in sorted(set(base_plans) ^ set(new_plans)):
+        print(f"{name:<7} only present in {base_run_id if name in base_plans else new_run_id}")
+
+    return regressions
+
+usage = """Usage:
+    python plan_history.py list
+    python plan_history.py compare <base_run_id> <new_run_id> [threshold]"""
+
+''' MAIN '''
+if __name__ == "__main__":
+    if len(sys.argv) in (4, 5) and sys.argv[1] == "compare":
+        threshold = float(sys.argv[4]) if len(sys.argv) > 4 else default_threshold
+        regressions = compare_runs(sys.argv[2], sys.argv[3], threshold)
+        sys.exit(1 if regressions else 0)
+    elif sys.argv[1:] in ([], ["list"]):
+        for run_id in list_runs():
+            print(run_id)
+    else:
+        print(usage)
+        sys.exit(2)
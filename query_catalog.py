@@ -0,0 +1,293 @@
+'''
+query_catalog.py
+=========================================================
+The Q_1 to Q_10 leaderboards from queries.py as parameterized SQL, for tools
+that run the workload against arbitrary competitions and seasons (load
+generation, services). Every query takes %(competition_id)s, %(season_id)s
+and %(type_id)s; queries.py itself keeps its literal template queries.
+
+Callers name the event type ('Shot', 'Pass', ...); query_params turns it
+into its type_id from a cache filled once per process by
+load_event_type_ids, so no query looks it up in event_types. run_query
+executes with prepare=True, so psycopg prepares each statement on the
+connection the first time and later calls skip parsing, and planning too
+once Postgres settles on a generic plan (after five executions, if it is
+not costlier than the custom plans).
+
+python query_catalog.py [dbname] reports, per query, the planning time of
+an unprepared call against a prepared one and how much preparing saves.
+
+Differences from queries.py: Q_2, Q_3 and Q_9 cover one season instead of
+all La Liga seasons (queries.py's Q_2 names 2020/2021 but joins
+competitions on competition_id alone, so every La Liga match passes the
+filter), Q_5 filters on the season as well as the competition, and Q_9
+counts dribbles with a Complete outcome (outcome id 8) rather than every
+dribble that has an outcome. Q_6 has the same competition_id-only join in
+queries.py, which makes no difference while Premier League 2003/2004 is the
+only Premier League season loaded.
+=========================================================
+'''
+
+import re
+import statistics
+import sys
+import psycopg
+from psycopg import sql
+
+# Default (competition_id, season_id, event_type) for each query: the season
+# queries.py names (see the differences above)
+LA_LIGA_2020_2021 = {'competition_id': 11, 'season_id': 90}
+PREMIER_LEAGUE_2003_2004 = {'competition_id': 2, 'season_id': 44}
+
+CATALOG = {
+    'Q_1': {
+        'title': 'Average xG per shot by player',
+        'defaults': dict(LA_LIGA_2020_2021, event_type='Shot'),
+        'sql': """
+    SELECT p.name AS player_name, AVG((e.event_details->>'statsbomb_xg')::float) AS average_xg
+    FROM events e
+    JOIN players p ON e.player_id = p.player_id
+    JOIN matches m ON e.match_id = m.match_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+      AND e.event_details ? 'statsbomb_xg'
+    GROUP BY p.name
+    HAVING AVG((e.event_details->>'statsbomb_xg')::float) > 0
+    ORDER BY average_xg DESC;
+    """,
+    },
+    'Q_2': {
+        'title': 'Shots by player',
+        'defaults': dict(LA_LIGA_2020_2021, event_type='Shot'),
+        'sql': """
+    SELECT p.name AS player_name, COUNT(e.event_id) AS number_of_shots
+    FROM events e
+    JOIN players p ON e.player_id = p.player_id
+    JOIN matches m ON e.match_id = m.match_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+    GROUP BY p.name
+    ORDER BY number_of_shots DESC;
+    """,
+    },
+    'Q_3': {
+        'title': 'First-time shots by player',
+        'defaults': dict(LA_LIGA_2020_2021, event_type='Shot'),
+        'sql': """
+    SELECT p.name AS player_name, COUNT(e.event_id) AS first_time_shots
+    FROM events e
+    JOIN players p ON e.player_id = p.player_id
+    JOIN matches m ON e.match_id = m.match_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+      AND (e.event_details->>'first_time')::boolean IS TRUE
+    GROUP BY p.name
+    ORDER BY first_time_shots DESC;
+    """,
+    },
+    'Q_4': {
+        'title': 'Passes by team',
+        'defaults': dict(LA_LIGA_2020_2021, event_type='Pass'),
+        'sql': """
+    SELECT t.name, COUNT(*) AS total_passes
+    FROM events e
+    JOIN matches m ON e.match_id = m.match_id
+    JOIN teams t ON e.team_id = t.team_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+    GROUP BY t.name
+    ORDER BY total_passes DESC;
+    """,
+    },
+    'Q_5': {
+        'title': 'Passes received by player',
+        'defaults': dict(PREMIER_LEAGUE_2003_2004, event_type='Pass'),
+        'sql': """
+    SELECT p.name AS player_name, COUNT(*) AS number_of_passes_received
+    FROM events e
+    JOIN matches m ON e.match_id = m.match_id
+    JOIN players p ON (e.event_details->'recipient'->>'id')::integer = p.player_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+    GROUP BY p.name
+    ORDER BY number_of_passes_received DESC;
+    """,
+    },
+    'Q_6': {
+        'title': 'Shots by team',
+        'defaults': dict(PREMIER_LEAGUE_2003_2004, event_type='Shot'),
+        'sql': """
+    SELECT t.name AS team_name, COUNT(e.event_id) AS shots
+    FROM events e
+    JOIN teams t ON e.team_id = t.team_id
+    JOIN matches m ON e.match_id = m.match_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+    GROUP BY t.name
+    ORDER BY shots DESC;
+    """,
+    },
+    'Q_7': {
+        'title': 'Through balls by player',
+        'defaults': dict(LA_LIGA_2020_2021, event_type='Pass'),
+        'sql': """
+    SELECT p.name AS player_name, COUNT(*) AS through_balls
+    FROM events e
+    JOIN players p ON e.player_id = p.player_id
+    JOIN matches m ON e.match_id = m.match_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+      AND (e.event_details->>'through_ball')::boolean IS NOT NULL
+    GROUP BY p.name
+    ORDER BY through_balls DESC;
+    """,
+    },
+    'Q_8': {
+        'title': 'Through balls by team',
+        'defaults': dict(LA_LIGA_2020_2021, event_type='Pass'),
+        'sql': """
+    SELECT t.name AS team_name, COUNT(*) AS through_balls
+    FROM events e
+    JOIN teams t ON e.team_id = t.team_id
+    JOIN matches m ON e.match_id = m.match_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+      AND (e.event_details->>'through_ball')::boolean IS NOT NULL
+    GROUP BY t.name
+    ORDER BY through_balls DESC;
+    """,
+    },
+    'Q_9': {
+        'title': 'Successful dribbles by player',
+        'defaults': dict(LA_LIGA_2020_2021, event_type='Dribble'),
+        'sql': """
+    SELECT p.name, COUNT(*) AS succesful_dribbles
+    FROM events e
+    JOIN players p ON p.player_id = e.player_id
+    JOIN matches m ON e.match_id = m.match_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+      AND (e.event_details->'outcome'->>'id')::integer = 8
+    GROUP BY p.name
+    ORDER BY succesful_dribbles DESC;
+    """,
+    },
+    'Q_10': {
+        'title': 'Times dribbled past by player',
+        'defaults': dict(LA_LIGA_2020_2021, event_type='Dribbled Past'),
+        'sql': """
+    SELECT p.name AS player_name, COUNT(*) AS dribble_past
+    FROM events e
+    JOIN players p ON e.player_id = p.player_id
+    JOIN matches m ON e.match_id = m.match_id
+    WHERE m.competition_id = %(competition_id)s AND m.season_id = %(season_id)s
+      AND e.type_id = %(type_id)s
+    GROUP BY p.name
+    ORDER BY dribble_past DESC;
+    """,
+    },
+}
+
+EVENT_TYPES_QUERY = "SELECT name, type_id FROM event_types;"
+
+# Event type name -> type_id. The ids come from the StatsBomb data, so they
+# are the same in every database loaded by json_loader.
+_event_type_ids = {}
+
+# Cache the (name, type_id) rows of event_types. Every event type a catalog
+# query defaults to must be there, so a database missing one fails here, at
+# startup, rather than in the middle of a run.
+def cache_event_type_ids(rows):
+    type_ids = dict(rows)
+    missing = sorted({entry['defaults']['event_type'] for entry in CATALOG.values()} - set(type_ids))
+    if missing:
+        raise LookupError(f"event_types has no {', '.join(missing)}: is the database loaded?")
+    _event_type_ids.update(type_ids)
+
+# Fill the event type cache from the database, once per process
+def load_event_type_ids(cursor):
+    if not _event_type_ids:
+        cursor.execute(EVENT_TYPES_QUERY)
+        cache_event_type_ids(cursor.fetchall())
+    return _event_type_ids
+
+def event_type_id(event_type):
+    if not _event_type_ids:
+        raise LookupError("event type ids are not cached yet, call load_event_type_ids first")
+    if event_type not in _event_type_ids:
+        raise LookupError(f"unknown event type {event_type!r}")
+    return _event_type_ids[event_type]
+
+def query_names():
+    return sorted(CATALOG, key=lambda name: int(name.split('_')[1]))
+
+def query_params(name, competition_id=None, season_id=None, event_type=None):
+    params = dict(CATALOG[name]['defaults'])
+    if competition_id is not None:
+        params['competition_id'] = competition_id
+    if season_id is not None:
+        params['season_id'] = season_id
+    if event_type is not None:
+        params['event_type'] = event_type
+    params['type_id'] = event_type_id(params['event_type'])
+    return params
+
+# Run a catalog query as a prepared statement on the cursor's connection
+def run_query(cursor, name, params):
+    cursor.execute(CATALOG[name]['sql'], params, prepare=True)
+    return cursor.fetchall()
+
+# The query with $1, $2, ... placeholders for PREPARE, and the parameter order
+def positional_sql(name):
+    order = []
+    def placeholder(match):
+        if match.group(1) not in order:
+            order.append(match.group(1))
+        return f"${order.index(match.group(1)) + 1}"
+    return re.sub(r"%\((\w+)\)s", placeholder, CATALOG[name]['sql']), order
+
+def planning_ms(cursor, statement, params=()):
+    cursor.execute(f"EXPLAIN (SUMMARY, FORMAT JSON) {statement}", params, prepare=False)
+    return cursor.fetchone()[0][0]['Planning Time']
+
+# Median planning time per call unprepared and prepared. The prepared
+# statement is executed past the five custom plans first, so the prepared
+# figure is what repeated calls pay once the plan cache has settled.
+def planning_report(conn, names=None, repeats=10):
+    cursor = conn.cursor()
+    load_event_type_ids(cursor)
+    report = []
+    for name in names or query_names():
+        params = query_params(name)
+        positional, order = positional_sql(name)
+        values = [params[key] for key in order]
+        statement = f"catalog_{name.lower()}"
+
+        unprepared = [planning_ms(cursor, CATALOG[name]['sql'], params) for _ in range(repeats)]
+        cursor.execute(f"PREPARE {statement} AS {positional.strip().rstrip(';')}")
+        # EXECUTE is a utility statement and cannot take bind parameters, so values are inlined
+        execute = sql.SQL("EXECUTE {}({})").format(
+            sql.Identifier(statement), sql.SQL(', ').join(sql.Literal(value) for value in values)).as_string(conn)
+        for _ in range(6):
+            cursor.execute(execute)
+        prepared = [planning_ms(cursor, execute) for _ in range(repeats)]
+        cursor.execute(f"DEALLOCATE {statement}")
+
+        report.append((name, statistics.median(unprepared), statistics.median(prepared)))
+    conn.rollback()
+    cursor.close()
+    return report
+
+def print_planning_report(report):
+    print(f"{'query':<7}{'unprepared ms':>15}{'prepared ms':>13}{'saved ms':>10}{'saved':>8}")
+    for name, unprepared, prepared in report:
+        saved = unprepared - prepared
+        print(f"{name:<7}{unprepared:>15.3f}{prepared:>13.3f}{saved:>10.3f}{(saved / unprepared if unprepared else 0):>8.0%}")
+    total_saved = sum(unprepared - prepared for _, unprepared, prepared in report)
+    print(f"Planning time saved per call of all ten queries: {total_saved:.2f} ms")
+
+''' MAIN '''
+if __name__ == "__main__":
+    dbname = sys.argv[1] if len(sys.argv) > 1 else 'query_database'
+    with psycopg.connect(f"dbname={dbname} user=postgres password=1234 host=localhost port=5432") as conn:
+        print_planning_report(planning_report(conn))
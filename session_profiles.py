@@ -0,0 +1,138 @@
+'''
+session_profiles.py
+=========================================================
+Per-query session settings for the Q_n harness (queries.py). A profile is a
+set of planner/executor settings (work_mem, parallel workers, JIT, ...)
+applied with SET LOCAL inside the query's transaction, so it affects only
+that query and disappears when its connection goes back to the pool.
+
+Profiles are read from session_profiles.json in the repository root (or the
+file named by QUERY_PROFILES), keyed by query:
+
+    {"Q_1": {"work_mem": "64MB", "jit": "off"},
+     "Q_5": {"max_parallel_workers_per_gather": "4"}}
+
+Queries without a profile run with the server defaults.
+
+Sweep mode (QUERY_SWEEP=1) tries every combination of a grid of values for
+each query (DEFAULT_GRID, or the JSON file named by QUERY_SWEEP_GRID), keeps
+the fastest, and runs the query with it, so the plan recorded in the plan
+history is the winning plan. The winning profiles are written to
+session_profiles.sweep.json, which reproduces the run with:
+
+    QUERY_PROFILES=session_profiles.sweep.json python queries.py
+=========================================================
+'''
+
+import itertools
+import json
+import os
+import statistics
+from psycopg import sql
+import plan_history
+
+# Directory Path
+dir_path = os.path.dirname(os.path.realpath(__file__))
+profiles_path = os.environ.get("QUERY_PROFILES", os.path.join(dir_path, "session_profiles.json"))
+sweep_output_path = os.path.join(dir_path, "session_profiles.sweep.json")
+
+# Settings a profile may change (all of them can be SET by any user)
+ALLOWED_SETTINGS = {
+    'work_mem', 'hash_mem_multiplier', 'max_parallel_workers_per_gather', 'parallel_setup_cost',
+    'parallel_tuple_cost', 'min_parallel_table_scan_size', 'jit', 'jit_above_cost',
+    'jit_inline_above_cost', 'jit_optimize_above_cost', 'random_page_cost', 'effective_cache_size',
+    'enable_hashjoin', 'enable_mergejoin', 'enable_nestloop', 'enable_hashagg', 'enable_sort',
+    'enable_seqscan', 'enable_bitmapscan', 'enable_indexscan', 'join_collapse_limit',
+}
+
+DEFAULT_GRID = {
+    'work_mem': ['4MB', '64MB', '256MB'],
+    'max_parallel_workers_per_gather': ['0', '2', '4'],
+    'jit': ['off', 'on'],
+}
+
+# Each profile is run this many times in a sweep; the fastest run counts
+sweep_repeats = 2
+
+def load_profiles(path=profiles_path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as file:
+        profiles = json.load(file)
+    for name, settings in profiles.items():
+        check_settings(settings, f"{path} {name}")
+    return profiles
+
+def load_grid():
+    grid_path = os.environ.get("QUERY_SWEEP_GRID")
+    if not grid_path:
+        return DEFAULT_GRID
+    with open(grid_path, 'r', encoding='utf-8') as file:
+        grid = json.load(file)
+    check_settings(grid, grid_path)
+    return grid
+
+def check_settings(settings, source):
+    unknown = sorted(set(settings) - ALLOWED_SETTINGS)
+    if unknown:
+        raise ValueError(f"{source}: unsupported settings {', '.join(unknown)}")
+
+# SET LOCAL each setting; must run inside the transaction the query runs in
+def apply_profile(cursor, settings):
+    for name, value in settings.items():
+        cursor.execute(sql.SQL("SET LOCAL {} = {}").format(sql.Identifier(name), sql.Literal(str(value))))
+
+def profile_text(settings):
+    return ", ".join(f"{name}={value}" for name, value in settings.items()) or "server defaults"
+
+# Every combination of the grid values, starting with the server defaults
+def grid_profiles(grid):
+    names = list(grid)
+    return [{}] + [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+# Time one profile: fastest EXPLAIN ANALYZE execution time over sweep_repeats runs,
+# each in its own transaction so SET LOCAL starts from the defaults
+def time_profile(cursor, sql_query, settings):
+    best_plan = None
+    for _ in range(sweep_repeats):
+        cursor.connection.rollback()
+        apply_profile(cursor, settings)
+        plan = plan_history.capture_plan(cursor, sql_query)
+        if best_plan is None or plan["Execution Time"] < best_plan["Execution Time"]:
+            best_plan = plan
+    cursor.connection.rollback()
+    return best_plan
+
+# Try every grid profile for one query; returns [(execution ms, settings, plan)]
+# sorted fastest first
+def sweep(cursor, sql_query, grid):
+    # Warm the cache so the first profile is not charged for reading the tables
+    cursor.connection.rollback()
+    plan_history.capture_plan(cursor, sql_query)
+
+    results = []
+    for settings in grid_profiles(grid):
+        plan = time_profile(cursor, sql_query, settings)
+        results.append((plan["Execution Time"], settings, plan))
+    results.sort(key=lambda result: result[0])
+    return results
+
+def print_sweep(name, results, top=5):
+    default_ms = next(ms for ms, settings, _ in results if not settings)
+    best_ms, best_settings, best_plan = results[0]
+    print(f"{name} sweep over {len(results)} profiles (median {statistics.median(r[0] for r in results):.1f} ms):")
+    for ms, settings, _ in results[:top]:
+        print(f"    {ms:>10.1f} ms  {profile_text(settings)}")
+    print(f"    fastest: {profile_text(best_settings)}, {best_ms:.1f} ms vs {default_ms:.1f} ms with server defaults "
+          f"({default_ms / best_ms if best_ms else 0:.2f}x)")
+    print(f"    plan: {' / '.join(plan_history.node_shape(best_plan))}")
+
+# Merge one query's winning profile into session_profiles.sweep.json
+def save_sweep_profile(name, settings, path=sweep_output_path):
+    profiles = load_profiles(path)
+    if settings:
+        profiles[name] = settings
+    else:
+        profiles.pop(name, None)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(dict(sorted(profiles.items(), key=lambda item: int(item[0].split("_")[1]))), file, indent=2)
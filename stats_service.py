@@ -0,0 +1,330 @@
+'''
+stats_service.py
+=========================================================
+Read-only HTTP service for the Q_1 to Q_10 leaderboards (query_catalog.py),
+for internal apps that would otherwise run the SQL themselves. Needs nothing
+but the standard library, psycopg and a local Postgres.
+
+    GET /leaderboards                                  queries and their default parameters
+    GET /leaderboards/Q_4?competition_id=11&season_id=90
+    GET /matches/3773386/timeline?minute_from=60&minute_to=75&after=<next>&limit=500
+    GET /stats                                         cache hit rate and latency percentiles
+
+Leaderboards are cached in process (LRU, --cache-size entries). The loader
+sends a NOTIFY on the stats_data_changed channel with every commit (see
+json_loader/db.py); a listener thread clears the cache when one arrives, and
+also when its own connection has to be re-established, since notifications
+may have been missed meanwhile. Responses carry an ETag (a hash of the body),
+and a request whose If-None-Match matches gets 304 Not Modified.
+
+Match timelines (json_loader/timeline.py) are not cached: they are read page
+by page with keyset pagination, and each response's "next" value is passed
+back as ?after= to get the following page.
+
+Queries go through a connection pool (--pool-size) and run as prepared
+statements on each pooled connection. Latency percentiles cover the last
+10,000 requests and include cache hits.
+
+Usage:
+    python stats_service.py --port 8080
+    curl -i 'localhost:8080/leaderboards/Q_1?competition_id=11&season_id=42'
+=========================================================
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import psycopg
+from psycopg_pool import ConnectionPool
+from latency_stats import percentile
+from query_catalog import CATALOG, load_event_type_ids, query_names, query_params, run_query
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), 'json_loader'))
+from timeline import read_timeline_page, encode_cursor, decode_cursor
+
+max_timeline_page = 5000
+
+# Connection Information (the database the loader writes to)
+db_name = 'project_database'
+db_username = 'postgres'
+db_password = '1234'
+db_host = 'localhost'
+db_port = '5432'
+
+# Must match data_changed_channel in json_loader/db.py
+data_changed_channel = 'stats_data_changed'
+
+latency_window = 10000
+
+class LeaderboardCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped on every clear, so a result computed before a clear is not stored after it
+        self.generation = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, self.generation
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry, self.generation
+
+    def put(self, key, entry, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class RequestStats:
+    def __init__(self):
+        self.latencies = deque(maxlen=latency_window)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def record(self, seconds, status):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+            if status == 304:
+                self.not_modified += 1
+            elif status >= 500:
+                self.errors += 1
+
+    def report(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                'requests': self.requests,
+                'not_modified': self.not_modified,
+                'errors': self.errors,
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            }
+
+# Clear the cache whenever the loader commits (LISTEN on data_changed_channel)
+def listen_for_changes(conninfo, cache, stop):
+    while not stop.is_set():
+        try:
+            with psycopg.connect(conninfo, autocommit=True) as conn:
+                conn.execute(f"LISTEN {data_changed_channel}")
+                # Anything committed while we were not listening is unknown
+                cache.clear()
+                while not stop.is_set():
+                    for _ in conn.notifies(timeout=1.0, stop_after=1):
+                        cache.clear()
+        except psycopg.OperationalError as error:
+            print(f"[ERROR] change listener: {error}, reconnecting")
+            stop.wait(5.0)
+
+def run_leaderboard(pool, name, params):
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            rows = run_query(cursor, name, params)
+            columns = [column.name for column in cursor.description]
+    body = {'query': name, 'title': CATALOG[name]['title'], 'params': params,
+            'columns': columns, 'rows': rows}
+    return json.dumps(body, default=str).encode('utf-8')
+
+def run_timeline(pool, match_id, after, minute_from, minute_to, page_size):
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            rows, next_key = read_timeline_page(cursor, match_id, after, minute_from, minute_to, page_size)
+            columns = [column.name for column in cursor.description]
+    body = {'match_id': match_id, 'events': [dict(zip(columns, row)) for row in rows],
+            'next': encode_cursor(next_key) if next_key else None}
+    return json.dumps(body, default=str).encode('utf-8')
+
+def json_body(obj):
+    return json.dumps(obj, default=str).encode('utf-8')
+
+def etag_for(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+# If-None-Match is '*' or a comma-separated list of entity tags, each possibly
+# weak (W/"..."); it matches when any tag equals etag (weak comparison)
+def etag_matches(if_none_match, etag):
+    if if_none_match is None:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+class StatsHandler(BaseHTTPRequestHandler):
+    # Set by make_server
+    pool = None
+    cache = None
+    stats = None
+
+    def do_GET(self):
+        start = time.perf_counter()
+        status = 500
+        try:
+            status = self.route()
+        except Exception as error:
+            print(f"[ERROR] {self.path}: {error}")
+            status = self.send_json(500, {'error': 'query failed'})
+        finally:
+            self.stats.record(time.perf_counter() - start, status)
+
+    def route(self):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['leaderboards']:
+            return self.send_json(200, [{'query': name, 'title': CATALOG[name]['title'],
+                                         'defaults': CATALOG[name]['defaults']} for name in query_names()])
+        if len(parts) == 2 and parts[0] == 'leaderboards':
+            return self.leaderboard(parts[1], parse_qs(url.query))
+        if len(parts) == 3 and parts[0] == 'matches' and parts[2] == 'timeline':
+            return self.timeline(parts[1], parse_qs(url.query))
+        if parts == ['stats']:
+            return self.send_json(200, self.report())
+        return self.send_json(404, {'error': 'not found'})
+
+    def leaderboard(self, name, query):
+        if name not in CATALOG:
+            return self.send_json(404, {'error': f'unknown query {name}'})
+        try:
+            competition_id = int(query['competition_id'][0]) if 'competition_id' in query else None
+            season_id = int(query['season_id'][0]) if 'season_id' in query else None
+        except ValueError:
+            return self.send_json(400, {'error': 'competition_id and season_id must be integers'})
+        params = query_params(name, competition_id, season_id)
+        key = (name, params['competition_id'], params['season_id'])
+
+        entry, generation = self.cache.get(key)
+        if entry is None:
+            body = run_leaderboard(self.pool, name, params)
+            entry = (body, etag_for(body))
+            self.cache.put(key, entry, generation)
+        body, etag = entry
+        return self.send_tagged(body, etag)
+
+    def timeline(self, match_id, query):
+        try:
+            match_id = int(match_id)
+            minute_from = int(query['minute_from'][0]) if 'minute_from' in query else None
+            minute_to = int(query['minute_to'][0]) if 'minute_to' in query else None
+            page_size = min(int(query['limit'][0]), max_timeline_page) if 'limit' in query else 500
+            after = decode_cursor(query['after'][0]) if 'after' in query else None
+        except ValueError:
+            return self.send_json(400, {'error': 'match_id, minute_from, minute_to and limit must be integers, '
+                                                 'after a next value from a previous page'})
+        if page_size < 1:
+            return self.send_json(400, {'error': 'limit must be positive'})
+        body = run_timeline(self.pool, match_id, after, minute_from, minute_to, page_size)
+        return self.send_tagged(body, etag_for(body))
+
+    # 304 if the client already has this body, the body otherwise
+    def send_tagged(self, body, etag):
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return 304
+        return self.send_bytes(200, body, etag)
+
+    def report(self):
+        report = self.stats.report()
+        pool_stats = self.pool.get_stats()
+        report.update({
+            'cache_entries': len(self.cache.entries),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'cache_hit_rate': round(self.cache.hit_rate(), 4),
+            'cache_invalidations': self.cache.invalidations,
+            'pool_size': pool_stats.get('pool_size', 0),
+            'pool_available': pool_stats.get('pool_available', 0),
+            'pool_wait_ms': pool_stats.get('requests_wait_ms', 0),
+        })
+        return report
+
+    def send_json(self, status, obj):
+        return self.send_bytes(status, json_body(obj))
+
+    def send_bytes(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(args, conninfo):
+    pool = ConnectionPool(conninfo, min_size=args.pool_size, max_size=args.pool_size,
+                          check=ConnectionPool.check_connection, open=True)
+    with pool.connection() as conn:
+        load_event_type_ids(conn.cursor())
+    StatsHandler.pool = pool
+    StatsHandler.cache = LeaderboardCache(args.cache_size)
+    StatsHandler.stats = RequestStats()
+    return ThreadingHTTPServer((args.host, args.port), StatsHandler), pool
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Read-only Q_n leaderboard service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--dbname', default=db_name)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--cache-size', type=int, default=256, help="cached leaderboards (LRU)")
+    return parser.parse_args()
+
+''' MAIN '''
+if __name__ == "__main__":
+    args = parse_args()
+    conninfo = f"dbname={args.dbname} user={db_username} password={db_password} host={db_host} port={db_port}"
+    server, pool = make_server(args, conninfo)
+    stop = threading.Event()
+    listener = threading.Thread(target=listen_for_changes, args=(conninfo, StatsHandler.cache, stop), daemon=True)
+    listener.start()
+    print(f"Serving leaderboards from {args.dbname} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        pool.close()